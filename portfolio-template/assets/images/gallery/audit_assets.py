@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Gallery asset audit against portfolio-data.xml
+
+Loads the portfolio XML once into an index of referenced image names, scans
+gallery/ and gallery/thumbnails/ once each, and reports as JSON:
+- missing: referenced in the XML but not present in gallery/
+- missing_thumbnails: referenced but with no matching file in thumbnails/
+- orphaned: files in gallery/ that nothing references
+- orphaned_thumbnails: thumbnails with neither a reference nor a full image
+
+Every check is a set lookup, so the audit stays linear in the number of
+references plus files.
+"""
+
+import argparse
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_XML = SCRIPT_DIR.parents[2] / 'portfolio-data.xml'
+
+# File types the portfolio can display
+IMAGE_SUFFIXES = {'.webp', '.jpg', '.jpeg', '.png', '.gif', '.avif', '.svg'}
+
+
+def load_references(xml_path):
+    """Index every <image> reference: {filename: [{project, rank}, ...]}"""
+    root = ET.parse(xml_path).getroot()
+    references = {}
+    for project in root.iter('project'):
+        project_id = project.get('id', '')
+        for image in project.iter('image'):
+            name = (image.text or '').strip()
+            if name:
+                references.setdefault(name, []).append({
+                    'project': project_id,
+                    'rank': image.get('rank', ''),
+                })
+    return references
+
+
+def scan_images(directory):
+    """Names of image files directly inside a directory (one scandir pass)"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries
+                    if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES}
+    except FileNotFoundError:
+        return set()
+
+
+def audit(xml_path, gallery_dir):
+    """Diff the XML references against the gallery and thumbnail files"""
+    references = load_references(xml_path)
+    gallery_dir = Path(gallery_dir)
+    images = scan_images(gallery_dir)
+    thumbnails = scan_images(gallery_dir / 'thumbnails')
+    referenced = set(references)
+
+    def with_refs(names):
+        return [{'file': name, 'references': references[name]} for name in sorted(names)]
+
+    missing = referenced - images
+    missing_thumbnails = referenced - thumbnails
+    orphaned = images - referenced
+    orphaned_thumbnails = thumbnails - referenced - images
+
+    return {
+        'xml': str(xml_path),
+        'gallery': str(gallery_dir),
+        'summary': {
+            'referenced': len(referenced),
+            'images': len(images),
+            'thumbnails': len(thumbnails),
+            'missing': len(missing),
+            'missing_thumbnails': len(missing_thumbnails),
+            'orphaned': len(orphaned),
+            'orphaned_thumbnails': len(orphaned_thumbnails),
+        },
+        'missing': with_refs(missing),
+        'missing_thumbnails': with_refs(missing_thumbnails),
+        'orphaned': sorted(orphaned),
+        'orphaned_thumbnails': sorted(orphaned_thumbnails),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report gallery files missing from or unused by portfolio-data.xml',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Audit this gallery against the template's portfolio-data.xml
+  python audit_assets.py
+
+  # Write the report to a file and fail if anything referenced is missing
+  python audit_assets.py --output audit.json --strict
+        """
+    )
+    parser.add_argument('--xml', default=str(DEFAULT_XML),
+                       help='Portfolio XML to read (default: portfolio-template/portfolio-data.xml)')
+    parser.add_argument('--gallery', default=str(SCRIPT_DIR),
+                       help='Gallery directory containing thumbnails/ (default: this directory)')
+    parser.add_argument('--output', '-o',
+                       help='Write the JSON report here instead of stdout')
+    parser.add_argument('--strict', action='store_true',
+                       help='Exit with status 1 if any referenced image or thumbnail is missing')
+
+    args = parser.parse_args()
+
+    if not Path(args.xml).exists():
+        print(f"Error: XML file '{args.xml}' does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    report = audit(args.xml, args.gallery)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+        summary = report['summary']
+        print(f"Wrote {args.output}: {summary['missing']} missing, "
+              f"{summary['missing_thumbnails']} without thumbnails, "
+              f"{summary['orphaned']} orphaned")
+    else:
+        print(text)
+
+    summary = report['summary']
+    if args.strict and (summary['missing'] or summary['missing_thumbnails']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for convert_images.py
+
+Generates a synthetic photo-like corpus in a temporary directory and runs
+ImageConverter over it with an increasing number of worker processes,
+reporting images/sec for each worker count.
+
+With --compare-fast-load it instead converts the corpus once with
+full-resolution decoding and once with reduced-resolution decoding, each in
+a fresh process, and reports per-image time and peak RSS.
+
+With --compare-pipeline it compares the serial loop against the threaded
+decode/resize/encode pipeline on the same corpus.
+
+With --compare-crop it times each automatic crop strategy per image,
+next to the WebP encode of the resulting full-size output for scale.
+
+With --compare-transform it times the flatten and resize/thumbnail stages
+per image on transparent copies of the corpus, against the previous
+implementation (split-alpha paste, full-resolution crop copy, thumbnails
+from the full crop).
+
+With --compare-tiling it writes a transparent panorama as PNG and as
+uncompressed TIFF and converts each with the normal whole-image path and
+the strip-by-strip path, each in a fresh process, reporting time and peak RSS.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from convert_images import CROP_STRATEGIES, ImageConverter, flatten_rgb, peak_rss_mb
+
+
+def make_corpus(directory, count=24, size=(3000, 2000), seed=1234):
+    """Write `count` synthetic JPEGs with gradients, shapes and noise"""
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    width, height = size
+
+    for i in range(count):
+        img = Image.linear_gradient('L').resize(size).convert('RGB')
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            x1, y1 = x0 + rng.randrange(50, 600), y0 + rng.randrange(50, 600)
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        noise = Image.effect_noise(size, 40).convert('RGB')
+        img = Image.blend(img, noise, 0.25).filter(ImageFilter.SMOOTH)
+        img.save(directory / f"synthetic_{i:04d}.jpg", 'JPEG', quality=92)
+
+    return directory
+
+
+def time_run(input_dir, output_dir, **options):
+    """Convert the corpus once from scratch and return elapsed seconds"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    converter = ImageConverter(input_dir, output_dir, **options)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        converter.process_directory()
+        return time.perf_counter() - start
+
+
+def profile_load_path(input_dir, output_dir, fast_load):
+    """Child process: convert serially, return per-image seconds and peak RSS"""
+    converter = ImageConverter(input_dir, output_dir, fast_load=fast_load)
+    timings = []
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for img_path in sorted(Path(input_dir).glob('*.jpg')):
+            start = time.perf_counter()
+            converter.process_image(img_path)
+            timings.append(time.perf_counter() - start)
+    return timings, peak_rss_mb()
+
+
+def compare_fast_load(corpus, workdir):
+    """Report full-resolution vs reduced-resolution decoding"""
+    print(f"\n{'decode':>8} {'ms/image':>10} {'peak RSS MB':>12}")
+    for label, fast_load in (('full', False), ('draft', True)):
+        # A fresh process per path so peak RSS isn't shared between them
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            timings, peak_mb = pool.submit(
+                profile_load_path, corpus, workdir / f'output-{label}', fast_load).result()
+        per_image = 1000 * sum(timings) / len(timings)
+        print(f"{label:>8} {per_image:>10.1f} {peak_mb:>12.1f}")
+
+
+def compare_pipeline(corpus, workdir, count):
+    """Report wall-clock time for the serial loop vs the streaming pipeline"""
+    print(f"\n{'mode':>10} {'seconds':>10} {'images/sec':>12} {'speedup':>9}")
+    baseline = None
+    for label, options in (('serial', {}), ('pipeline', {'pipeline': True})):
+        elapsed = time_run(corpus, workdir / 'output', **options)
+        baseline = baseline or elapsed
+        print(f"{label:>10} {elapsed:>10.2f} {count / elapsed:>12.2f} {baseline / elapsed:>8.2f}x")
+
+
+def make_panoramas(directory, size):
+    """Write one large transparent panorama as PNG and as uncompressed TIFF"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    width, height = size
+    img = Image.linear_gradient('L').resize(size).convert('RGBA')
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        x = i * width // 12
+        draw.ellipse((x, height // 4, x + width // 10, 3 * height // 4), fill=(200, 60, 30, 160))
+    for suffix in ('png', 'tif'):
+        img.save(directory / f'panorama.{suffix}')
+    return sorted(directory.iterdir())
+
+
+def profile_tiling(img_path, output_dir, tile_threshold):
+    """Child process: convert one image, return seconds and peak RSS"""
+    Image.MAX_IMAGE_PIXELS = None
+    converter = ImageConverter(img_path.parent, output_dir, tile_threshold=tile_threshold)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        converter.process_image(img_path)
+        elapsed = time.perf_counter() - start
+    return elapsed, peak_rss_mb()
+
+
+def compare_tiling(workdir, size):
+    """Report the whole-image path against strip-by-strip decoding"""
+    # Generated in a child so forked workers don't inherit its memory
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        panoramas = pool.submit(make_panoramas, workdir / 'panoramas', size).result()
+    print(f"\n{'source':>14} {'path':>8} {'seconds':>9} {'peak RSS MB':>12}")
+    for img_path in panoramas:
+        for label, threshold in (('whole', 0), ('strips', 1)):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                elapsed, peak_mb = pool.submit(
+                    profile_tiling, img_path, workdir / f'output-{label}', threshold).result()
+            print(f"{img_path.name:>14} {label:>8} {elapsed:>9.2f} {peak_mb:>12.1f}")
+
+
+def legacy_flatten(img):
+    """Previous flatten: P converted to RGBA, alpha split out as the mask"""
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    background.paste(img, mask=img.split()[-1])
+    return background
+
+
+def legacy_transform(converter, img):
+    """Previous resize stage: crop copy, ladder, thumbnails from the full crop"""
+    img = converter.smart_crop(img)
+    renders = [img.resize(converter.target_size, Image.Resampling.LANCZOS)]
+    side = min(img.size)
+    left, top = (img.width - side) // 2, (img.height - side) // 2
+    square = img.crop((left, top, left + side, top + side))
+    square.thumbnail(converter.thumb_size, Image.Resampling.LANCZOS)
+    return renders + [square]
+
+
+def current_transform(converter, img):
+    """Current resize stage, as in ImageConverter.transform_image"""
+    img_path = converter.input_dir / 'benchmark.jpg'
+    box = converter.crop_box(img)
+    renders = list(converter.render_variants(img, img_path, box))
+    source, source_box = converter.thumbnail_source(img, box, renders)
+    return renders + list(converter.render_thumbnails(source, img_path, source_box))
+
+
+def compare_transform(corpus, workdir):
+    """Report per-image flatten and resize time, previous vs current"""
+    converter = ImageConverter(corpus, workdir / 'output')
+    transparent = []
+    for img_path in sorted(Path(corpus).glob('*.jpg')):
+        img = Image.open(img_path).convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize(img.size))
+        transparent.append(img)
+    flattened = [flatten_rgb(img) for img in transparent]
+
+    def per_image_ms(func, images):
+        start = time.perf_counter()
+        for img in images:
+            func(img)
+        return 1000 * (time.perf_counter() - start) / len(images)
+
+    print(f"\n{'stage':>10} {'previous ms':>12} {'current ms':>11} {'saved ms':>9}")
+    for label, previous, current, images in (
+            ('flatten', legacy_flatten, flatten_rgb, transparent),
+            ('resize', lambda img: legacy_transform(converter, img),
+             lambda img: current_transform(converter, img), flattened)):
+        previous_ms = per_image_ms(previous, images)
+        current_ms = per_image_ms(current, images)
+        print(f"{label:>10} {previous_ms:>12.1f} {current_ms:>11.1f} {previous_ms - current_ms:>9.1f}")
+
+
+def compare_crop(corpus, workdir):
+    """Report per-image time of each crop strategy against the encode"""
+    print(f"\n{'crop':>10} {'crop ms':>10} {'encode ms':>10} {'crop share':>11}")
+    images = sorted(Path(corpus).glob('*.jpg'))
+    for strategy in CROP_STRATEGIES:
+        converter = ImageConverter(corpus, workdir / 'output', crop=strategy)
+        crop_time = encode_time = 0.0
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            for img_path in images:
+                img, _ = converter.decode_image(img_path)
+                start = time.perf_counter()
+                cropped = converter.smart_crop(img)
+                crop_time += time.perf_counter() - start
+                resized = cropped.resize(converter.target_size, Image.Resampling.LANCZOS)
+                start = time.perf_counter()
+                converter.encode_webp(resized, converter.quality)
+                encode_time += time.perf_counter() - start
+        crop_ms = 1000 * crop_time / len(images)
+        encode_ms = 1000 * encode_time / len(images)
+        print(f"{strategy:>10} {crop_ms:>10.2f} {encode_ms:>10.1f} "
+              f"{100 * crop_time / encode_time:>10.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ImageConverter throughput')
+    parser.add_argument('--images', type=int, default=24,
+                       help='Number of synthetic images (default: 24)')
+    parser.add_argument('--size', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                       default=[3000, 2000], help='Synthetic image size (default: 3000 2000)')
+    parser.add_argument('--max-jobs', type=int, default=os.cpu_count() or 1,
+                       help='Highest worker count to test (default: CPU count)')
+    parser.add_argument('--compare-fast-load', action='store_true',
+                       help='Compare full vs reduced-resolution decoding instead')
+    parser.add_argument('--compare-pipeline', action='store_true',
+                       help='Compare the serial loop against --pipeline instead')
+    parser.add_argument('--compare-crop', action='store_true',
+                       help='Time each automatic crop strategy per image instead')
+    parser.add_argument('--compare-transform', action='store_true',
+                       help='Time flatten and resize/thumbnail stages against the previous code instead')
+    parser.add_argument('--compare-tiling', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                       help='Compare whole-image vs strip decoding of a WIDTHxHEIGHT panorama instead')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='convert-bench-'))
+    try:
+        if args.compare_tiling:
+            compare_tiling(workdir, tuple(args.compare_tiling))
+            return
+
+        print(f"Generating {args.images} synthetic images at {args.size[0]}x{args.size[1]}...")
+        corpus = make_corpus(workdir / 'input', args.images, tuple(args.size))
+
+        if args.compare_fast_load:
+            compare_fast_load(corpus, workdir)
+            return
+        if args.compare_pipeline:
+            compare_pipeline(corpus, workdir, args.images)
+            return
+        if args.compare_crop:
+            compare_crop(corpus, workdir)
+            return
+        if args.compare_transform:
+            compare_transform(corpus, workdir)
+            return
+
+        print(f"\n{'jobs':>6} {'seconds':>10} {'images/sec':>12} {'speedup':>9}")
+        baseline = None
+        for jobs in range(1, args.max_jobs + 1):
+            elapsed = time_run(corpus, workdir / 'output', jobs=jobs)
+            rate = args.images / elapsed
+            baseline = baseline or rate
+            print(f"{jobs:>6} {elapsed:>10.2f} {rate:>12.2f} {rate / baseline:>8.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark suite for the gallery image tooling
+
+Builds a reproducible synthetic corpus -- JPEG photos, opaque and
+transparent PNGs, palette images, a large panorama, and a rename map with
+thousands of entries -- then runs ImageConverter and rename_files against
+it. Every case runs in a fresh process and records wall time, throughput,
+peak RSS and output bytes.
+
+With --save-baseline the results are written to the baseline file;
+otherwise they are compared against it, and the script exits with status 1
+if any case got slower, used more memory or wrote more bytes than
+--threshold percent.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import PIL
+from PIL import Image
+
+from benchmark_images import make_corpus, make_panoramas
+from convert_images import ImageConverter, peak_rss_mb
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR / 'thumbnails'))
+from rename_files import plan_renames, rename_files  # noqa: E402
+
+DEFAULT_BASELINE = SCRIPT_DIR / 'benchmark_baseline.json'
+
+# Metrics where a larger value is a regression
+COMPARED = ('seconds', 'peak_rss_mb', 'output_bytes')
+
+# Timing changes smaller than this are noise, whatever the percentage
+MIN_SECONDS_CHANGE = 0.05
+
+
+def make_mixed_corpus(directory, count, size, seed):
+    """JPEG photos plus PNG, RGBA PNG and palette copies of some of them"""
+    directory = Path(directory)
+    make_corpus(directory, count, size, seed)
+    photos = sorted(directory.glob('*.jpg'))
+    for i, img_path in enumerate(photos[:max(3, count // 4)]):
+        with Image.open(img_path) as img:
+            img.save(directory / f'opaque_{i:04d}.png')
+            rgba = img.convert('RGBA')
+            rgba.putalpha(Image.linear_gradient('L').resize(img.size))
+            rgba.save(directory / f'alpha_{i:04d}.png')
+            img.convert('P', palette=Image.Palette.ADAPTIVE).save(
+                directory / f'palette_{i:04d}.png', transparency=0)
+    return len(list(directory.iterdir()))
+
+
+def make_rename_map(count, seed):
+    """A rename map of `count` entries, some of them swapping names"""
+    rng = random.Random(seed)
+    # Odd entries have spaces, which the matcher normalizes to underscores
+    names = [f"Gallery Shot {i:05d}.webp" if i % 2 else f"gallery_shot_{i:05d}.webp"
+             for i in range(count)]
+    rename_map = {name: f"project-{rng.randrange(100):02d}_shot-{i:05d}_standard.webp"
+                  for i, name in enumerate(names)}
+    # Every 50th entry swaps names with its neighbour, which the planner
+    # routes through temporary files
+    for i in range(0, count - 2, 50):
+        a, b = names[i], names[i + 2]
+        rename_map[a], rename_map[b] = b, a
+    return rename_map
+
+
+def output_bytes(directory):
+    """Total size of the image files under an output directory"""
+    return sum(path.stat().st_size for path in Path(directory).rglob('*')
+               if path.suffix in ('.webp', '.avif', '.jxl'))
+
+
+def run_convert(input_dir, output_dir, options, fresh=True):
+    """Child process: one ImageConverter run over a directory"""
+    Image.MAX_IMAGE_PIXELS = None
+    if fresh:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    converter = ImageConverter(input_dir, output_dir, **options)
+    images = len(list(converter.iter_images()))
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        converter.process_directory()
+        elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'per_second': images / elapsed,
+        # With --jobs the decoding happens in worker processes
+        'peak_rss_mb': peak_rss_mb(children=True),
+        'output_bytes': output_bytes(output_dir),
+    }
+
+
+def run_rename(directory, rename_map, execute):
+    """Child process: plan (or plan and execute) a rename map"""
+    shutil.rmtree(directory, ignore_errors=True)
+    (Path(directory) / 'thumbnails').mkdir(parents=True)
+    for name in rename_map:
+        (Path(directory) / name).touch()
+        (Path(directory) / 'thumbnails' / name).touch()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        if execute:
+            rename_files(str(directory), dry_run=False, rename_map=rename_map)
+        else:
+            plan_renames(str(directory), rename_map)
+        elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'per_second': 2 * len(rename_map) / elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def in_child(func, *args):
+    """Run a case in a fresh process so peak RSS is its own"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, *args).result()
+
+
+def run_suite(workdir, args):
+    """Build the corpus and run every case, keeping each one's fastest repeat"""
+    workdir = Path(workdir)
+    print(f"Generating corpus: {args.images} photos at {args.size[0]}x{args.size[1]}, "
+          f"{args.panorama[0]}x{args.panorama[1]} panorama, {args.renames} renames...")
+    in_child(make_mixed_corpus, workdir / 'mixed', args.images, tuple(args.size), args.seed)
+    in_child(make_panoramas, workdir / 'panorama', tuple(args.panorama))
+    rename_map = make_rename_map(args.renames, args.seed)
+
+    cases = {
+        'convert_serial': lambda: in_child(
+            run_convert, workdir / 'mixed', workdir / 'out-serial', {}),
+        'convert_incremental': lambda: in_child(
+            run_convert, workdir / 'mixed', workdir / 'out-serial', {}, False),
+        'convert_jobs': lambda: in_child(
+            run_convert, workdir / 'mixed', workdir / 'out-jobs', {'jobs': os.cpu_count() or 1}),
+        'convert_pipeline': lambda: in_child(
+            run_convert, workdir / 'mixed', workdir / 'out-pipeline', {'pipeline': True}),
+        'convert_panorama': lambda: in_child(
+            run_convert, workdir / 'panorama', workdir / 'out-panorama', {}),
+        'rename_plan': lambda: in_child(run_rename, workdir / 'rename', rename_map, False),
+        'rename_execute': lambda: in_child(run_rename, workdir / 'rename', rename_map, True),
+    }
+
+    results = {}
+    for name, run in cases.items():
+        runs = [run() for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda r: r['seconds'])
+        result = results[name]
+        print(f"  {name:<22} {result['seconds']:>8.3f}s {result['per_second']:>10.1f}/s "
+              f"{result['peak_rss_mb']:>8.1f} MB" +
+              (f" {result['output_bytes'] / 1024:>10.1f} KB" if 'output_bytes' in result else ''))
+    return results
+
+
+def environment():
+    """What the numbers depend on besides the code"""
+    return {
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(baseline, results, threshold):
+    """Print changes against the baseline; return the regressions found"""
+    regressions = []
+    print(f"\n{'case':<22} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<22} (not in baseline)")
+            continue
+        for metric in COMPARED:
+            if metric not in result or not previous.get(metric):
+                continue
+            change = 100 * (result[metric] - previous[metric]) / previous[metric]
+            flag = ''
+            noise = metric == 'seconds' and result[metric] - previous[metric] < MIN_SECONDS_CHANGE
+            if change > threshold and not noise:
+                regressions.append((name, metric, change))
+                flag = '  REGRESSION'
+            print(f"{name:<22} {metric:<12} {previous[metric]:>12.2f} {result[metric]:>12.2f} "
+                  f"{change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark convert_images.py and rename_files.py against a stored baseline',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Record a baseline on this machine
+  python benchmark_suite.py --save-baseline
+
+  # After upgrading Pillow or changing settings: fail on >15% regressions
+  python benchmark_suite.py --threshold 15
+        """
+    )
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                       help='Baseline file (default: benchmark_baseline.json next to this script)')
+    parser.add_argument('--save-baseline', action='store_true',
+                       help='Write the results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=15.0,
+                       help='Allowed increase in time, peak RSS or bytes, in percent (default: 15)')
+    parser.add_argument('--images', type=int, default=12,
+                       help='Number of synthetic photos (default: 12)')
+    parser.add_argument('--size', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                       default=[2400, 1600], help='Synthetic photo size (default: 2400 1600)')
+    parser.add_argument('--panorama', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                       default=[16000, 4000],
+                       help='Panorama size, above the strip-decoding threshold (default: 16000 4000)')
+    parser.add_argument('--renames', type=int, default=5000,
+                       help='Entries in the synthetic rename map (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per case; the fastest is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=1234,
+                       help='Corpus random seed (default: 1234)')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='convert-suite-'))
+    try:
+        results = run_suite(workdir, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    corpus = {key: getattr(args, key) for key in ('images', 'size', 'panorama', 'renames', 'seed')}
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(
+            {'environment': environment(), 'corpus': corpus, 'cases': results}, indent=2) + '\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    try:
+        baseline = json.loads(Path(args.baseline).read_text())
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+        return 1
+    if baseline.get('corpus') != corpus:
+        print("\nWarning: corpus options differ from the baseline's; results are not comparable")
+    if baseline.get('environment') != environment():
+        print(f"Note: baseline recorded on {baseline.get('environment')}")
+
+    regressions = compare(baseline.get('cases', {}), results, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:g}%")
+        return 1
+    print(f"\nNo regressions above {args.threshold:g}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,85 +6,308 @@ Features:
 - Converts images to WebP format (best compression for web)
 - Normalizes image sizes to 1920x1080 (or custom)
 - Generates 200x200 thumbnails
-- Interactive cropping preview with arrow key navigation
+- Interactive cropping preview with arrow key navigation, saved to a crop file
 - Preserves aspect ratios or allows custom cropping
+- Parallel batch conversion across CPU cores (--jobs)
+- Incremental re-runs via a content-hash manifest in the output directory
+- Reduced-resolution decoding of large sources (JPEG draft mode)
+- Responsive size ladders (srcset variants) rendered from a single decode
+- Streaming pipeline mode overlapping decode, resize and encode (--pipeline)
+- Single-pass directory discovery with optional recursion and filters
+- Adaptive per-image quality targeting a byte or SSIM budget
+- Content-aware automatic cropping (entropy or saliency)
+- Perceptual-hash near-duplicate detection before conversion (--dedupe)
+- Per-stage timing and memory metrics (--metrics) and cProfile dumps
+- Memory-bounded strip-by-strip decoding of very large panoramas and scans
+- Watch-folder daemon mode converting files as they arrive (--watch)
+- AVIF / JPEG XL output next to WebP, or the smallest codec per image (--formats)
+- Thumbnail sprite atlases with a JSON/CSS offset map, rebuilt incrementally
+- Low-quality placeholders (BlurHash, dominant colour, tiny WebP) per image
+- In-memory library API (convert_image) with optional backends loaded lazily
 """
 
+import argparse
+import base64
+import csv
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import math
 import os
+import queue
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager, redirect_stdout
+from fnmatch import fnmatch
 from pathlib import Path
-from PIL import Image
-import argparse
+from PIL import Image, features
 
-# Try to import pillow-heif for HEIC support
 try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class _LazyModule:
+    """Stand-in for an optional module, imported on first attribute access"""
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def _installed(name):
+    """True if a module can be imported, without importing it"""
+    return importlib.util.find_spec(name) is not None
+
+
+# Optional backends are only looked up here; each is imported the first
+# time something needs it, so short runs don't pay for (or warn about) them.
+# pillow-heif: HEIC/HEIF sources (see register_heif)
+HAS_HEIF = _installed('pillow_heif')
+# NumPy: SSIM quality search, content-aware crops, --best-format
+HAS_NUMPY = _installed('numpy')
+np = _LazyModule('numpy')
+# pillow-jxl-plugin: JPEG XL output (imported when 'jxl' is requested)
+HAS_JXL = _installed('pillow_jxl')
+# OpenCV: the interactive crop picker
+HAS_CV2 = _installed('cv2')
+cv2 = _LazyModule('cv2')
+
+HEIF_SUFFIXES = {'.heic', '.heif'}
+_heif_registered = False
+
+
+def register_heif(img_path):
+    """Register pillow-heif's opener before the first HEIC/HEIF file is opened"""
+    global _heif_registered
+    if _heif_registered or not HAS_HEIF or Path(img_path).suffix.lower() not in HEIF_SUFFIXES:
+        return
     from pillow_heif import register_heif_opener
     register_heif_opener()
-    HAS_HEIF = True
-except ImportError:
-    HAS_HEIF = False
-    print("Warning: pillow-heif not installed. HEIC/HEIF files will be skipped.")
-    print("Install with: pip3 install pillow-heif --break-system-packages")
+    _heif_registered = True
 
-# Try to import opencv for interactive preview
-try:
-    import cv2
-    import numpy as np
-    HAS_CV2 = True
-except ImportError:
-    HAS_CV2 = False
-    print("Warning: opencv-python not installed. Interactive cropping disabled.")
-    print("Install with: pip3 install opencv-python --break-system-packages")
+
+def register_jxl():
+    """Import pillow-jxl-plugin, which registers JPEG XL with Pillow.
+    
+    Called where JXL is encoded rather than once at startup, so pool
+    workers started with spawn or forkserver (which unpickle the converter
+    without running __init__) register it too.
+    """
+    importlib.import_module('pillow_jxl')
+
+
+MANIFEST_NAME = '.convert-manifest.json'
+MANIFEST_VERSION = 1
+VARIANTS_INDEX_NAME = 'variants.json'
+QUALITY_CACHE_NAME = '.quality-cache.json'
+PHASH_CACHE_NAME = '.phash-cache.json'
+DUPLICATES_NAME = 'duplicates.json'
+
+# Quality range searched by --target-kb / --target-ssim
+MIN_SEARCH_QUALITY = 20
+MAX_SEARCH_QUALITY = 100
+
+CROPS_NAME = 'crops.json'
+
+# Placeholder index (--placeholders): BlurHash components, the longest side
+# of the image they're computed from, and of the inline WebP preview
+PLACEHOLDERS_NAME = 'placeholders.json'
+BLURHASH_COMPONENTS = (4, 3)
+BLURHASH_SAMPLE = 32
+LQIP_SIZE = 16
+LQIP_QUALITY = 50
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# Thumbnail sprite atlases (--sprites), written under output_dir/SPRITES_DIR
+SPRITES_DIR = 'sprites'
+SPRITES_INDEX_NAME = 'sprites.json'
+SPRITES_CSS_NAME = 'sprites.css'
+SPRITE_COLUMNS = 8
+SPRITE_SIZE = 64
+
+# Crop strategies for automatic (non-saved) crops
+CROP_STRATEGIES = ('center', 'entropy', 'saliency')
+
+# Longest side of the downsampled copy scored by content-aware cropping
+ANALYSIS_SIZE = 256
+
+# Longest side of the interactive crop preview window
+PREVIEW_SIZE = 1200
+
+# Output codecs: Pillow format, file suffix, MIME type and extra save options.
+# Listed in <picture> source order, most efficient first.
+CODECS = {
+    'jxl': ('JXL', '.jxl', 'image/jxl', {}),
+    'avif': ('AVIF', '.avif', 'image/avif', {}),
+    'webp': ('WEBP', '.webp', 'image/webp', {'method': 6}),
+}
+
+# Stage names, in pipeline order, for metrics output
+STAGES = ('decode', 'exif_transpose', 'reduce', 'flatten', 'crop', 'resize', 'encode',
+          'placeholder')
+
+# EXIF orientations that rotate the image by 90 degrees (width/height swap)
+SWAPPED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Transpose that undoes each EXIF orientation (as ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Sources above this many pixels are decoded strip by strip (--tile-threshold)
+TILE_THRESHOLD = 50_000_000
+
+# Rough upper bound on the memory of one decoded strip
+STRIP_BYTES = 32 * 1024 * 1024
+
+# --watch: seconds between polls, and how long a file's size and mtime must
+# hold still before it's treated as fully written
+WATCH_INTERVAL = 1.0
+WATCH_SETTLE = 2.0
 
 
 class ImageConverter:
     def __init__(self, input_dir, output_dir, target_size=(1000, 1000), 
-                 thumb_size=(200, 200), quality=85, interactive=False):
+                 thumb_size=(200, 200), quality=85, interactive=False, jobs=1,
+                 crops_path=None,
+                 force=False, fast_load=True, variants=(), thumb_variants=(),
+                 pipeline=False, queue_depth=2, recursive=False, include=(),
+                 exclude=(), target_kb=None, target_ssim=None, crop='center',
+                 dedupe=None, dedupe_distance=6, metrics_path=None,
+                 tile_threshold=TILE_THRESHOLD, formats=('webp',), best_format=False,
+                 sprites=False, sprite_size=SPRITE_SIZE, placeholders=False,
+                 crops=None, log=print):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.target_size = target_size
         self.thumb_size = thumb_size
         self.quality = quality
         self.interactive = interactive and HAS_CV2
-        
-        # Create output directories
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        (self.output_dir / "thumbnails").mkdir(exist_ok=True)
+        if interactive and not HAS_CV2:
+            print("Warning: opencv-python not installed. Interactive cropping disabled.")
+            print("Install with: pip3 install opencv-python --break-system-packages")
+        # Where per-image progress goes (print for the CLI; a logger or a
+        # no-op when embedded)
+        self.log = log
+        self.jobs = max(1, jobs)
+        self.pipeline = pipeline
+        self.queue_depth = max(1, queue_depth)
+        self.recursive = recursive
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.target_kb = target_kb
+        self.target_ssim = target_ssim
+        if target_ssim is not None and not HAS_NUMPY:
+            raise RuntimeError("--target-ssim requires numpy (pip3 install numpy)")
+        if crop not in CROP_STRATEGIES:
+            raise ValueError(f"Unknown crop strategy: {crop}")
+        if crop != 'center' and not HAS_NUMPY:
+            raise RuntimeError(f"--crop {crop} requires numpy (pip3 install numpy)")
+        self.crop_strategy = crop
+        for fmt in formats:
+            if fmt not in CODECS:
+                raise ValueError(f"Unknown output format: {fmt}")
+            if fmt == 'avif' and not features.check('avif'):
+                raise RuntimeError("AVIF output needs Pillow built with libavif (pip3 install -U pillow)")
+            if fmt == 'jxl':
+                if not HAS_JXL:
+                    raise RuntimeError("JPEG XL output requires pillow-jxl-plugin (pip3 install pillow-jxl-plugin)")
+                register_jxl()
+        # Output codecs in the order given; the first is the reference for --best-format
+        self.formats = list(dict.fromkeys(formats))
+        if best_format and not HAS_NUMPY:
+            raise RuntimeError("--best-format requires numpy (pip3 install numpy)")
+        self.best_format = best_format and len(self.formats) > 1
+        # Thumbnails per sprite atlas, when packing atlases is enabled
+        self.sprites = sprites
+        self.sprite_size = max(1, sprite_size)
+        self.placeholders = placeholders
+        # None, 'report' or 'skip'
+        self.dedupe = dedupe
+        self.dedupe_distance = dedupe_distance
+        # Per-image stage timings, collected when a metrics file is requested
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.metrics_records = []
+        self.quality_cache_path = self.output_dir / QUALITY_CACHE_NAME
+        # Filled in by process_directory so workers can look up cached
+        # quality search results for each source
+        self.source_hashes = {}
+        self.quality_cache = {}
+        self.force = force
+        self.fast_load = fast_load
+        # Pixel count above which sources take the strip-by-strip path (0 = never)
+        self.tile_threshold = tile_threshold
+        # Extra srcset widths for the full image and thumbnail, largest first
+        self.variants = sorted(set(variants), reverse=True)
+        self.thumb_variants = sorted(set(thumb_variants), reverse=True)
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+        # Crop regions picked with --interactive, keyed by source path;
+        # `crops` supplies them directly instead of reading the crop file
+        self.crops_path = Path(crops_path) if crops_path else self.input_dir / CROPS_NAME
+        self.crop_regions = dict(crops) if crops is not None else self.load_crop_regions()
         
         # Supported input formats
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif', '.heic', '.heif'}
     
-    def get_crop_region_interactive(self, img_path):
-        """Interactive cropping using arrow keys"""
-        img = cv2.imread(str(img_path))
-        if img is None:
-            print(f"Error loading {img_path} with OpenCV")
-            return None
+    def load_preview(self, img_path, max_display=PREVIEW_SIZE):
+        """Decode a small, oriented BGR preview for the crop picker.
         
-        height, width = img.shape[:2]
-        target_w, target_h = self.target_size
-        target_aspect = target_w / target_h
+        Returns (preview, full_size) where full_size is the oriented size of
+        the original, so picked boxes can be stored in source pixels.
+        """
+        register_heif(img_path)
+        img = Image.open(img_path)
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in SWAPPED_ORIENTATIONS:
+            width, height = height, width
+        img.draft('RGB', (max_display, max_display))
+        from PIL import ImageOps
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((max_display, max_display), Image.Resampling.LANCZOS)
+        return np.ascontiguousarray(np.asarray(img)[:, :, ::-1]), (width, height)
+    
+    def pick_crop_region(self, img_path):
+        """Interactive cropping using arrow keys on a downscaled preview.
         
-        # Calculate maximum crop size maintaining target aspect ratio
-        if width / height > target_aspect:
-            # Image is wider - limit by height
-            crop_h = height
-            crop_w = int(height * target_aspect)
-        else:
-            # Image is taller - limit by width
-            crop_w = width
-            crop_h = int(width / target_aspect)
+        Returns a crop-file entry ({'box', 'size'} in full-resolution
+        pixels, or {'skip': True}), or None if the user quit.
+        """
+        preview, full_size = self.load_preview(img_path)
+        height, width = preview.shape[:2]
+        crop_w, crop_h = self.crop_size_for(width, height)
+        target_aspect = self.target_size[0] / self.target_size[1]
+        scale = full_size[0] / width
+        
+        # Darkened copy for outside the crop, computed once per image
+        dimmed = (preview * 0.3).astype(preview.dtype)
         
         # Start centered
         x = (width - crop_w) // 2
         y = (height - crop_h) // 2
         
-        step = 10  # pixels to move per key press
+        step = max(1, round(10 / scale))  # ~10 source pixels per key press
         
         print(f"\n{'='*60}")
-        print(f"File: {img_path.name}")
-        print(f"Original size: {width}x{height}")
-        print(f"Crop size: {crop_w}x{crop_h} (aspect ratio {target_aspect:.2f})")
+        print(f"File: {self.source_key(img_path)}")
+        print(f"Original size: {full_size[0]}x{full_size[1]} (preview {width}x{height})")
+        print(f"Crop size: {round(crop_w * scale)}x{round(crop_h * scale)} (aspect ratio {target_aspect:.2f})")
         print(f"{'='*60}")
         print("\nControls:")
         print("  Arrow Keys: Move crop region")
@@ -95,47 +318,30 @@ class ImageConverter:
         print(f"{'='*60}\n")
         
         while True:
-            # Create display image
-            display = img.copy()
-            
-            # Draw crop rectangle
-            cv2.rectangle(display, (x, y), (x + crop_w, y + crop_h), (0, 255, 0), 3)
-            
-            # Add semi-transparent overlay outside crop area
-            overlay = display.copy()
-            cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 0), -1)
-            cv2.rectangle(overlay, (x, y), (x + crop_w, y + crop_h), (0, 0, 0), -1)
-            cv2.addWeighted(display, 0.7, overlay, 0.3, 0, display)
-            cv2.rectangle(display, (x, y), (x + crop_w, y + crop_h), (0, 255, 0), 3)
+            # Dim everything outside the crop region
+            display = dimmed.copy()
+            display[y:y + crop_h, x:x + crop_w] = preview[y:y + crop_h, x:x + crop_w]
+            cv2.rectangle(display, (x, y), (x + crop_w, y + crop_h), (0, 255, 0), 2)
             
             # Add text info
-            info_text = f"Position: ({x}, {y}) | Use arrow keys to adjust"
+            info_text = f"Position: ({round(x * scale)}, {round(y * scale)}) | Use arrow keys to adjust"
             cv2.putText(display, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 
                        0.7, (0, 255, 0), 2)
             
-            # Resize for display if too large
-            max_display = 1200
-            if width > max_display or height > max_display:
-                scale = min(max_display / width, max_display / height)
-                display_w = int(width * scale)
-                display_h = int(height * scale)
-                display_resized = cv2.resize(display, (display_w, display_h))
-            else:
-                display_resized = display
-            
-            cv2.imshow('Crop Preview - Arrow Keys to Move', display_resized)
+            cv2.imshow('Crop Preview - Arrow Keys to Move', display)
             
             key = cv2.waitKey(0) & 0xFF
             
             if key == 13:  # Enter
                 cv2.destroyAllWindows()
-                return (x, y, x + crop_w, y + crop_h)
+                box = self.scale_region((x, y, x + crop_w, y + crop_h), (width, height), full_size)
+                return {'box': list(box), 'size': list(full_size)}
             elif key == ord('s'):  # Skip
                 cv2.destroyAllWindows()
-                return None
+                return {'skip': True}
             elif key == ord('q'):  # Quit
                 cv2.destroyAllWindows()
-                sys.exit(0)
+                return None
             elif key == ord('c'):  # Center
                 x = (width - crop_w) // 2
                 y = (height - crop_h) // 2
@@ -148,8 +354,56 @@ class ImageConverter:
             elif key == 84:  # Down arrow
                 y = min(height - crop_h, y + step)
     
+    def run_crop_picker(self, images):
+        """Pick crops for images that don't have one in the crop file yet.
+        
+        Each choice is written to the crop file immediately, so quitting
+        part way keeps the work done so far.
+        """
+        todo = [img_path for img_path in images
+                if self.source_key(img_path) not in self.crop_regions]
+        print(f"\nCrop file: {self.crops_path}")
+        print(f"Images needing a crop: {len(todo)} (already set: {len(images) - len(todo)})")
+        if not todo:
+            return True
+        input("\nPress Enter to start interactive cropping...")
+        
+        for img_path in todo:
+            try:
+                choice = self.pick_crop_region(img_path)
+            except Exception as e:
+                print(f"  ✗ Error: {str(e)}")
+                continue
+            if choice is None:
+                return False
+            self.crop_regions[self.source_key(img_path)] = choice
+            self.save_crop_regions()
+        return True
+    
+    def load_crop_regions(self):
+        """Load saved crops: {source key: {'box': [l, t, r, b], 'size': [w, h]}}"""
+        try:
+            with open(self.crops_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def save_crop_regions(self):
+        """Write the crop file"""
+        write_json(self.crops_path, self.crop_regions)
+    
     def smart_crop(self, img):
-        """Automatically crop image to target aspect ratio (center crop)"""
+        """Automatically crop image to target aspect ratio"""
+        box = self.crop_box(img)
+        return img if box == (0, 0) + img.size else img.crop(box)
+    
+    def crop_box(self, img):
+        """Box of the automatic crop to the target aspect ratio.
+        
+        'center' takes the middle of the frame; 'entropy' and 'saliency'
+        slide the crop window along the long axis of a small grayscale/RGB
+        copy and keep the most detailed or most salient position.
+        """
         width, height = img.size
         target_w, target_h = self.target_size
         target_aspect = target_w / target_h
@@ -157,153 +411,1759 @@ class ImageConverter:
         
         if abs(current_aspect - target_aspect) < 0.01:
             # Already correct aspect ratio
-            return img
+            return (0, 0, width, height)
         
-        if current_aspect > target_aspect:
-            # Image is wider - crop width
-            new_width = int(height * target_aspect)
-            left = (width - new_width) // 2
-            return img.crop((left, 0, left + new_width, height))
+        crop_w, crop_h = self.crop_size_for(width, height)
+        if self.crop_strategy == 'center':
+            left = (width - crop_w) // 2
+            top = (height - crop_h) // 2
         else:
-            # Image is taller - crop height
-            new_height = int(width / target_aspect)
-            top = (height - new_height) // 2
-            return img.crop((0, top, width, top + new_height))
+            left, top = self.find_crop_offset(img, crop_w, crop_h)
+        return (left, top, left + crop_w, top + crop_h)
     
-    def create_thumbnail(self, img):
-        """Create square thumbnail with center crop"""
+    def find_crop_offset(self, img, crop_w, crop_h):
+        """Best (left, top) for a crop window using the content-aware scores.
+        
+        Works on a copy with its longest side at ANALYSIS_SIZE: each
+        column (or row) gets a score, prefix sums give every window's total
+        in one pass, and the winning offset is scaled back to full size.
+        """
         width, height = img.size
-        size = min(width, height)
+        scale = max(1.0, max(width, height) / ANALYSIS_SIZE)
+        small = img.resize((max(1, round(width / scale)), max(1, round(height / scale))),
+                           Image.Resampling.BOX)
+        horizontal = crop_w < width
+        window = max(1, round((crop_w if horizontal else crop_h) / scale))
         
-        # Center crop to square
-        left = (width - size) // 2
-        top = (height - size) // 2
-        img_square = img.crop((left, top, left + size, top + size))
+        if self.crop_strategy == 'entropy':
+            scores = window_entropy(small, window, horizontal)
+        else:
+            scores = window_saliency(small, window, horizontal)
         
-        # Resize to thumbnail size
-        img_square.thumbnail(self.thumb_size, Image.Resampling.LANCZOS)
+        # Prefer the centre when windows score about the same
+        positions = np.arange(len(scores))
+        middle = (len(scores) - 1) / 2
+        scores = scores - 1e-3 * np.abs(scores).max() * np.abs(positions - middle) / max(middle, 1)
+        best = int(np.argmax(scores))
         
-        return img_square
+        if horizontal:
+            return min(width - crop_w, round(best * scale)), 0
+        return 0, min(height - crop_h, round(best * scale))
     
-    def process_image(self, img_path):
-        """Process a single image"""
-        print(f"\nProcessing: {img_path.name}")
+    def crop_size_for(self, width, height):
+        """Size of the largest target-aspect crop that fits width x height"""
+        target_w, target_h = self.target_size
+        target_aspect = target_w / target_h
+        if width / height > target_aspect:
+            return int(height * target_aspect), height
+        return width, int(width / target_aspect)
+    
+    def required_decode_size(self, width, height, box=None):
+        """Smallest full-frame size that still yields a crop large enough for
+        the target and thumbnail, or None if the source is already smaller.
         
-        try:
-            # Check if it's a HEIC file and warn if library not available
-            if img_path.suffix.lower() in ['.heic', '.heif'] and not HAS_HEIF:
-                print(f"  ✗ Error: HEIC file but pillow-heif not installed")
-                print(f"    Install with: pip3 install pillow-heif --break-system-packages")
-                return False
+        `box` is a saved crop region in full-resolution pixels; without one
+        the full-frame automatic crop is assumed.
+        """
+        if box:
+            crop_w, crop_h = max(1, box[2] - box[0]), max(1, box[3] - box[1])
+        else:
+            crop_w, crop_h = self.crop_size_for(width, height)
+        largest_w, largest_h = max([self.target_size] + [self.variant_size(w) for w in self.variants])
+        largest_thumb = max([max(self.thumb_size)] + self.thumb_variants)
+        scale = max(largest_w / crop_w,
+                    largest_h / crop_h,
+                    largest_thumb / min(crop_w, crop_h))
+        if scale >= 1:
+            return None
+        return math.ceil(width * scale), math.ceil(height * scale)
+    
+    def open_image(self, img_path, fp=None, crop=None):
+        """Open and orient an image, decoding at reduced resolution if allowed.
+        
+        Reads from the file object `fp` instead of img_path if given. The
+        reduced size is chosen for the saved crop-file entry `crop`, if any.
+        Returns the image and its full-resolution (oriented) size, so crop
+        regions picked on the original can be mapped onto the decoded image.
+        """
+        register_heif(img_path)
+        with self.stage('decode'):
+            img = Image.open(img_path if fp is None else fp)
+            self.log(f"  Opened: {img.format} {img.size} {img.mode}")
+            record = getattr(_metrics_local, 'record', None)
+            if record is not None:
+                record['format'] = img.format
+                record['pixels'] = img.width * img.height
             
-            # Open image
-            img = Image.open(img_path)
-            print(f"  Opened: {img.format} {img.size} {img.mode}")
+            width, height = img.size
+            swapped = img.getexif().get(0x0112, 1) in SWAPPED_ORIENTATIONS
+            if swapped:
+                width, height = height, width
+            full_size = (width, height)
+            required = None
+            if self.fast_load:
+                box = None
+                if crop and crop.get('box'):
+                    box = self.scale_region(crop['box'], crop.get('size', full_size), full_size)
+                required = self.required_decode_size(width, height, box)
             
-            # Fix EXIF orientation (prevents rotation issues)
+            # JPEG can decode straight to 1/2, 1/4 or 1/8 scale via DCT scaling,
+            # so only other formats need the strip-by-strip path
+            tiled = (self.tile_threshold and img.format != 'JPEG'
+                     and width * height > self.tile_threshold)
+            if required and img.format == 'JPEG':
+                img.draft(None, required[::-1] if swapped else required)
+                if img.size != full_size[::-1 if swapped else 1]:
+                    self.log(f"  Draft decode: {img.size}")
+            if not tiled:
+                img.load()
+        
+        if tiled:
+            return self.load_tiled(img, required), full_size
+        
+        # Fix EXIF orientation (prevents rotation issues)
+        with self.stage('exif_transpose'):
             try:
                 from PIL import ImageOps
                 img = ImageOps.exif_transpose(img)
             except Exception:
                 pass  # If no EXIF data, continue normally
-            
-            # Convert to RGB if necessary (for transparency)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Interactive or automatic cropping
-            if self.interactive:
-                crop_region = self.get_crop_region_interactive(img_path)
-                if crop_region is None:
-                    print("  Skipped by user")
-                    return False
-                img = img.crop(crop_region)
+        
+        # Other formats decode fully; shrink by an integer factor right away
+        # so the colour conversion and crop copies work on fewer pixels.
+        # Stay at least 2x above the required size so the final LANCZOS pass
+        # still does the real filtering (same idea as resize's reducing_gap).
+        if required:
+            factor = min(img.width // required[0], img.height // required[1]) // 2
+            if factor >= 2:
+                with self.stage('reduce'):
+                    img = img.reduce(factor)
+                self.log(f"  Reduced by {factor}x: {img.size}")
+        
+        return img, full_size
+    
+    def load_tiled(self, img, required):
+        """Decode a very large source strip by strip into a reduced RGB image.
+        
+        Each strip is flattened to RGB and reduced before the next one is
+        read, so the full-size RGBA, background and crop copies of the
+        normal path never exist. Uncompressed rasters (TIFF, BMP, PPM) are
+        read from the file one strip at a time; other formats are decoded
+        once at their native mode and then processed in strips.
+        """
+        read_strip = None
+        if img.getexif().get(0x0112, 1) == 1:
+            read_strip = raw_strip_reader(img)
+        if read_strip is None:
+            with self.stage('decode'):
+                img.load()
+            read_strip = lambda top, bottom: img.crop((0, top, img.width, bottom))
+        
+        # TIFF applies its orientation while loading, so look again
+        orientation = img.getexif().get(0x0112, 1)
+        width, height = img.size
+        factor = 1
+        if required:
+            req_w, req_h = required[::-1] if orientation in SWAPPED_ORIENTATIONS else required
+            factor = max(1, min(width // req_w, height // req_h) // 2)
+        # Whole multiples of the factor, so every strip reduces cleanly
+        rows = max(1, STRIP_BYTES // (4 * width) // factor) * factor
+        canvas = Image.new('RGB', (-(-width // factor), -(-height // factor)))
+        self.log(f"  Tiled decode: {rows}-row strips, reduced by {factor}x to {canvas.size}")
+        
+        for top in range(0, height, rows):
+            with self.stage('decode'):
+                strip = read_strip(top, min(height, top + rows))
+            with self.stage('flatten'):
+                strip = flatten_rgb(strip)
+            if factor > 1:
+                with self.stage('reduce'):
+                    strip = strip.reduce(factor)
+            canvas.paste(strip, (0, top // factor))
+        img.close()
+        
+        if orientation in ORIENTATION_TRANSPOSE:
+            with self.stage('exif_transpose'):
+                canvas = canvas.transpose(ORIENTATION_TRANSPOSE[orientation])
+        return canvas
+    
+    @staticmethod
+    def scale_region(region, full_size, size):
+        """Map a crop box on the full-resolution image onto a reduced decode"""
+        if tuple(size) == tuple(full_size):
+            return tuple(region)
+        sx = size[0] / full_size[0]
+        sy = size[1] / full_size[1]
+        left, top, right, bottom = region
+        return (round(left * sx), round(top * sy),
+                min(size[0], round(right * sx)), min(size[1], round(bottom * sy)))
+    
+    def variant_size(self, width):
+        """Size of a srcset variant: `width` at the target aspect ratio"""
+        target_w, target_h = self.target_size
+        return width, max(1, round(width * target_h / target_w))
+    
+    def render_variants(self, img, img_path, box=None):
+        """Render the full-size ladder from the crop box of the image.
+        
+        Sizes are produced largest first, each downscaled from the previous
+        one rather than from the original; the first resize reads straight
+        from the box, so the full-resolution crop is never copied. Variants
+        larger than the crop are skipped; the base target size is always
+        produced. Yields (relative_path, image) pairs.
+        """
+        box = box or (0, 0) + img.size
+        crop_w, crop_h = box[2] - box[0], box[3] - box[1]
+        stem = self.output_stem(img_path)
+        ladder = [(self.target_size, f"{stem}.webp", True)]
+        ladder += [(self.variant_size(w), f"{stem}-{w}w.webp", False) for w in self.variants]
+        ladder.sort(key=lambda step: step[0][0], reverse=True)
+        
+        current = img
+        for size, path, required in ladder:
+            if not required and (size[0] > crop_w or size[1] > crop_h):
+                continue
+            current = current.resize(size, Image.Resampling.LANCZOS, box=box)
+            box = None
+            yield path, current
+    
+    def thumbnail_source(self, img, box, renders):
+        """Smallest already-rendered image that can still supply every
+        thumbnail, falling back to the crop box of the decoded image.
+        
+        Renders are only reused when the box already has the target aspect
+        ratio; otherwise they are stretched and the thumbnail would be too.
+        """
+        crop_w, crop_h = box[2] - box[0], box[3] - box[1]
+        target_w, target_h = self.target_size
+        if abs(crop_w / crop_h - target_w / target_h) >= 0.01:
+            return img, box
+        crop_side = min(crop_w, crop_h)
+        needed = min(crop_side, max([max(self.thumb_size)] + self.thumb_variants))
+        for _, rendered in sorted(renders, key=lambda r: r[1].width):
+            if min(rendered.size) >= needed and needed < crop_side:
+                return rendered, None
+        return img, box
+    
+    def render_thumbnails(self, img, img_path, box=None):
+        """Render the base thumbnail plus square thumbnail variants.
+        
+        Yields (relative_path, image) pairs from the centre square of the
+        box; variants are downscaled progressively, largest first.
+        """
+        stem = self.output_stem(img_path)
+        square = self.square_box(box or (0, 0) + img.size)
+        square_side = square[2] - square[0]
+        side = min(square_side, *self.thumb_size)
+        yield f"thumbnails/{stem}.webp", img.resize((side, side), Image.Resampling.LANCZOS, box=square)
+        
+        current = img
+        for side in self.thumb_variants:
+            if side > square_side:
+                continue
+            current = current.resize((side, side), Image.Resampling.LANCZOS, box=square)
+            square = None
+            yield f"thumbnails/{stem}-{side}w.webp", current
+    
+    @staticmethod
+    def square_box(box):
+        """Centred largest square inside a box"""
+        left, top, right, bottom = box
+        size = min(right - left, bottom - top)
+        left += (right - left - size) // 2
+        top += (bottom - top - size) // 2
+        return (left, top, left + size, top + size)
+    
+    def decode_image(self, img_path, fp=None):
+        """Pipeline stage 1: open, orient and flatten a source to RGB.
+        
+        Returns (img, full_size), or None if the file can't be handled.
+        """
+        # Check if it's a HEIC file and warn if library not available
+        if img_path.suffix.lower() in ['.heic', '.heif'] and not HAS_HEIF:
+            self.log(f"  ✗ Error: HEIC file but pillow-heif not installed")
+            self.log(f"    Install with: pip3 install pillow-heif --break-system-packages")
+            return None
+        
+        # Open image (possibly at reduced resolution) and fix orientation
+        crop = self.crop_regions.get(self.source_key(img_path))
+        img, full_size = self.open_image(img_path, fp, crop)
+        
+        # Convert to RGB if necessary (for transparency)
+        with self.stage('flatten'):
+            img = flatten_rgb(img)
+        
+        return img, full_size
+    
+    def transform_image(self, img_path, img, full_size):
+        """Pipeline stage 2: crop and render every output size.
+        
+        Returns a list of (relative_path, image) pairs, or None if the
+        image is marked as skipped in the crop file.
+        """
+        # Saved crop from the crop file, or automatic cropping
+        crop = self.crop_regions.get(self.source_key(img_path))
+        if crop and crop.get('skip'):
+            self.log("  Skipped (marked in crop file)")
+            return None
+        with self.stage('crop'):
+            if crop:
+                box = self.scale_region(crop['box'], crop.get('size', full_size), img.size)
             else:
-                img = self.smart_crop(img)
-            
-            # Resize to target size
-            img_resized = img.resize(self.target_size, Image.Resampling.LANCZOS)
-            
-            # Create thumbnail
-            thumb = self.create_thumbnail(img)
-            
-            # Save files
-            output_name = img_path.stem + '.webp'
-            output_path = self.output_dir / output_name
-            thumb_path = self.output_dir / "thumbnails" / output_name
-            
-            img_resized.save(output_path, 'WEBP', quality=self.quality, method=6)
-            thumb.save(thumb_path, 'WEBP', quality=self.quality, method=6)
-            
-            # Get file sizes
-            original_size = img_path.stat().st_size / 1024
-            new_size = output_path.stat().st_size / 1024
-            thumb_size = thumb_path.stat().st_size / 1024
-            
-            print(f"  ✓ Saved: {output_name}")
-            print(f"    Original: {original_size:.1f} KB → Full: {new_size:.1f} KB | Thumb: {thumb_size:.1f} KB")
+                box = self.crop_box(img)
+        
+        # Resize to the target size (plus any srcset variants) straight
+        # from the crop box, then take thumbnails from the smallest render
+        # that is still big enough
+        with self.stage('resize'):
+            renders = list(self.render_variants(img, img_path, box))
+            source, source_box = self.thumbnail_source(img, box, renders)
+            return renders + list(self.render_thumbnails(source, img_path, source_box))
+    
+    @property
+    def adaptive(self):
+        """True if quality is searched per image instead of fixed"""
+        return self.target_kb is not None or self.target_ssim is not None
+    
+    def quality_cache_key(self, img_path, fmt='webp'):
+        """Cache key for a source's quality search in one codec, or None if
+        its hash is unknown. Covers everything that changes the base image's
+        pixels, plus --quality, which caps the search and sets the baseline."""
+        source_hash = self.source_hashes.get(self.source_key(img_path))
+        if source_hash is None:
+            return None
+        target = f"kb={self.target_kb}" if self.target_kb is not None else f"ssim={self.target_ssim}"
+        crop = self.crop_regions.get(self.source_key(img_path), self.crop_strategy)
+        return json.dumps([source_hash, target, self.quality, list(self.target_size), crop,
+                           self.fast_load, fmt])
+    
+    @staticmethod
+    def encode_as(img, fmt, quality):
+        """Encode to an in-memory buffer in one of CODECS"""
+        pil_format, _, _, options = CODECS[fmt]
+        if fmt == 'jxl':
+            register_jxl()
+        buffer = io.BytesIO()
+        # save() stores its options on the image object, so concurrent
+        # encodes of one image each need their own copy
+        img.copy().save(buffer, pil_format, quality=quality, **options)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def encode_webp(img, quality):
+        """Encode to an in-memory WebP buffer"""
+        return ImageConverter.encode_as(img, 'webp', quality)
+    
+    def search_quality(self, img, fmt='webp', target_ssim=None):
+        """Binary-search the quality for the target budget.
+        
+        With --target-kb, picks the highest quality (up to --quality) whose
+        encode fits the byte budget; with --target-ssim (or an explicit
+        target_ssim), the lowest quality whose decoded
+        result reaches the SSIM target. Every trial is encoded in memory and
+        the winning buffer is returned so it is never encoded twice.
+        Returns (quality, data, baseline_bytes), where baseline_bytes is the
+        size at the fixed --quality setting.
+        """
+        trials = {}
+        by_size = target_ssim is None and self.target_kb is not None
+        target_ssim = target_ssim if target_ssim is not None else self.target_ssim
+        
+        def encode(quality):
+            if quality not in trials:
+                trials[quality] = self.encode_as(img, fmt, quality)
+            return trials[quality]
+        
+        if by_size:
+            budget = self.target_kb * 1024
+            fits = lambda quality: len(encode(quality)) <= budget
+        else:
+            reference = np.asarray(img.convert('L'), dtype=np.float64)
+            fits = lambda quality: ssim(reference, Image.open(io.BytesIO(encode(quality)))) >= target_ssim
+        
+        # Size shrinks and SSIM grows with quality, so for a byte budget we
+        # want the highest passing quality and for SSIM the lowest
+        best = None
+        low = MIN_SEARCH_QUALITY
+        high = min(self.quality, MAX_SEARCH_QUALITY) if by_size else MAX_SEARCH_QUALITY
+        while low <= high:
+            mid = (low + high) // 2
+            passed = fits(mid)
+            if by_size:
+                if passed:
+                    best, low = mid, mid + 1
+                else:
+                    high = mid - 1
+            elif passed:
+                best, high = mid, mid - 1
+            else:
+                low = mid + 1
+        if best is None:
+            # Budget unreachable: settle for the closest end of the range
+            best = MIN_SEARCH_QUALITY if by_size else MAX_SEARCH_QUALITY
+        
+        return best, encode(best), len(encode(self.quality))
+    
+    def encode_base(self, img, img_path, fmt):
+        """Encode the base image in one codec at its fixed or adaptive quality.
+        
+        Returns (fmt, quality, data, baseline_bytes); baseline_bytes is None
+        unless the quality was searched (or taken from the cache).
+        """
+        if not self.adaptive:
+            return fmt, self.quality, self.encode_as(img, fmt, self.quality), None
+        cached = self.quality_cache.get(self.quality_cache_key(img_path, fmt))
+        if cached:
+            return fmt, cached['quality'], self.encode_as(img, fmt, cached['quality']), \
+                cached['baseline_bytes']
+        return (fmt,) + self.search_quality(img, fmt)
+    
+    def pick_format(self, img, img_path, pool):
+        """--best-format: the smallest codec for the base image at equal quality.
+        
+        The first of --formats is encoded as usual; the SSIM of its result
+        is the bar each other codec's quality is searched to reach, so the
+        sizes compared are for the same visual quality. Returns one
+        encode_base-style tuple for the winner.
+        """
+        first = self.encode_base(img, img_path, self.formats[0])
+        reference = np.asarray(img.convert('L'), dtype=np.float64)
+        bar = ssim(reference, Image.open(io.BytesIO(first[2])))
+        
+        def search(fmt):
+            quality, data, _ = self.search_quality(img, fmt, target_ssim=bar)
+            return fmt, quality, data, None
+        
+        candidates = [first] + list(pool.map(search, self.formats[1:]))
+        self.log("    Formats at SSIM {:.4f}: ".format(bar) + ", ".join(
+            f"{fmt} {len(data) / 1024:.1f} KB (q{quality})" for fmt, quality, data, _ in candidates))
+        return min(candidates, key=lambda candidate: len(candidate[2]))
+    
+    @staticmethod
+    def format_path(path, fmt):
+        """Swap a rendered .webp output path over to another codec's suffix"""
+        return os.path.splitext(path)[0] + CODECS[fmt][1]
+    
+    def encode_renders(self, img_path, renders):
+        """Encode rendered images in each output codec, in memory.
+        
+        The base image is encoded first, in every codec at once (or, with
+        --best-format, only in the smallest codec at equal quality). In
+        adaptive mode its quality is searched (or taken from the cache) per
+        codec and reused for its srcset variants; thumbnails always use the
+        fixed --quality. The remaining encodes then run concurrently.
+        Returns a list of {path, format, width, height, bytes, quality, data}
+        dicts, base images first; the first also carries the placeholder
+        when placeholders are enabled.
+        """
+        output_name = self.output_stem(img_path) + '.webp'
+        renders = dict(renders)
+        base = renders.pop(output_name)
+        
+        def output(path, fmt, rendered, quality, data, baseline_bytes=None):
+            output = {'path': self.format_path(path, fmt), 'format': fmt,
+                      'width': rendered.width, 'height': rendered.height,
+                      'quality': quality, 'bytes': len(data), 'data': data}
+            if baseline_bytes is not None:
+                output['baseline_bytes'] = baseline_bytes
+            return output
+        
+        def encode(job):
+            path, fmt, rendered, quality = job
+            return output(path, fmt, rendered, quality, self.encode_as(rendered, fmt, quality))
+        
+        with self.stage('encode'), ThreadPoolExecutor(max_workers=len(self.formats)) as pool:
+            if self.best_format:
+                chosen = [self.pick_format(base, img_path, pool)]
+            else:
+                chosen = list(pool.map(lambda fmt: self.encode_base(base, img_path, fmt), self.formats))
+            outputs = [output(output_name, fmt, base, quality, data, baseline)
+                       for fmt, quality, data, baseline in chosen]
             
-            return True
+            jobs = [(path, fmt, rendered, self.quality if path.startswith('thumbnails/') else quality)
+                    for path, rendered in renders.items()
+                    for fmt, quality, _, _ in chosen]
+            outputs += pool.map(encode, jobs)
+        
+        if self.placeholders:
+            with self.stage('placeholder'):
+                outputs[0]['placeholder'] = make_placeholder(base)
+        return outputs
+    
+    def encode_outputs(self, img_path, renders):
+        """Pipeline stage 3: encode rendered images and write them out.
+        
+        Returns a list of {path, format, width, height, bytes, quality} dicts.
+        """
+        outputs = self.encode_renders(img_path, renders)
+        for output in outputs:
+            output_path = self.output_dir / output['path']
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(output.pop('data'))
+        
+        # Get file sizes
+        output_name = self.output_stem(img_path) + '.webp'
+        original_size = img_path.stat().st_size / 1024
+        thumb_name = f"thumbnails/{output_name}"
+        bases = [o for o in outputs if o['path'] == self.format_path(output_name, o['format'])]
+        for base in bases:
+            fmt = base['format']
+            thumb = next(o for o in outputs if o['path'] == self.format_path(thumb_name, fmt))
+            self.log(f"  ✓ Saved: {base['path']}")
+            self.log(f"    Original: {original_size:.1f} KB → Full: {base['bytes'] / 1024:.1f} KB | "
+                     f"Thumb: {thumb['bytes'] / 1024:.1f} KB")
+            if 'baseline_bytes' in base:
+                self.log(f"    Quality: {base['quality']} (fixed {self.quality} would be "
+                         f"{base['baseline_bytes'] / 1024:.1f} KB)")
+        names = {self.format_path(name, o['format']) for name in (output_name, thumb_name) for o in bases}
+        extra = [o for o in outputs if o['path'] not in names]
+        if extra:
+            self.log("    Variants: " + ", ".join(
+                f"{o['path']} {o['width']}x{o['height']} {o['bytes'] / 1024:.1f} KB" for o in extra))
+        
+        return outputs
+    
+    def process_image(self, img_path):
+        """Process a single image.
+        
+        Returns a list of {path, width, height, bytes} dicts for the files
+        written, or False if the image failed or was skipped.
+        """
+        self.log(f"\nProcessing: {self.source_key(img_path)}")
+        
+        record = self.start_metrics(img_path)
+        result = False
+        try:
+            decoded = self.decode_image(img_path)
+            if decoded is not None:
+                renders = self.transform_image(img_path, *decoded)
+                if renders is not None:
+                    result = self.encode_outputs(img_path, renders)
             
         except Exception as e:
-            print(f"  ✗ Error: {str(e)}")
+            self.log(f"  ✗ Error: {str(e)}")
+        
+        self.finish_metrics(record, result)
+        return result
+    
+    @contextmanager
+    def stage(self, name):
+        """Time a processing stage into the current image's metrics record"""
+        record = getattr(_metrics_local, 'record', None)
+        if record is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = record['stages']
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+    
+    def start_metrics(self, img_path):
+        """Begin this thread's metrics record for an image (if enabled)"""
+        record = None
+        if self.metrics_path:
+            record = {
+                'source': self.source_key(img_path),
+                'format': img_path.suffix.lower().lstrip('.'),
+                'stages': {},
+                'start': time.perf_counter(),
+                'start_peak': peak_rss_mb(),
+            }
+        _metrics_local.record = record
+        return record
+    
+    def finish_metrics(self, record, result):
+        """Close a metrics record with totals, output size and peak RSS.
+        
+        ru_maxrss only ever rises, so the process peak so far is recorded
+        as process_peak_rss_mb, and how far this image pushed it up as
+        peak_rss_growth_mb (0 for images that fit under an earlier peak).
+        """
+        _metrics_local.record = None
+        if record is None:
+            return
+        record['total'] = time.perf_counter() - record.pop('start')
+        record['ok'] = bool(result)
+        record['output_bytes'] = sum(o['bytes'] for o in result) if result else 0
+        record['process_peak_rss_mb'] = peak_rss_mb()
+        record['peak_rss_growth_mb'] = record['process_peak_rss_mb'] - record.pop('start_peak')
+        self.metrics_records.append(record)
+    
+    def write_metrics(self):
+        """Append this run's records to the metrics file (.csv or JSON Lines)"""
+        if not self.metrics_records:
+            return
+        run = time.strftime('%Y-%m-%dT%H:%M:%S')
+        if self.metrics_path.suffix.lower() == '.csv':
+            fields = ['run', 'source', 'format', 'pixels', 'ok', 'total', 'output_bytes',
+                      'process_peak_rss_mb', 'peak_rss_growth_mb'] + list(STAGES)
+            new_file = not self.metrics_path.exists()
+            with open(self.metrics_path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+                if new_file:
+                    writer.writeheader()
+                for record in self.metrics_records:
+                    writer.writerow({'run': run, **record, **record['stages']})
+        else:
+            with open(self.metrics_path, 'a') as f:
+                for record in self.metrics_records:
+                    f.write(json.dumps({'run': run, **record}) + '\n')
+    
+    def print_metrics_summary(self):
+        """Print per-stage and per-format latency percentiles for this run"""
+        records = self.metrics_records
+        if not records:
+            return
+        print(f"\nStage timings over {len(records)} images (ms):")
+        print(f"  {'stage':<16} {'p50':>8} {'p90':>8} {'p99':>8} {'total':>10}")
+        for name in STAGES + ('total',):
+            values = [r['stages'][name] if name != 'total' else r['total']
+                      for r in records if name == 'total' or name in r['stages']]
+            if values:
+                print(f"  {name:<16} {1000 * percentile(values, 50):>8.1f} "
+                      f"{1000 * percentile(values, 90):>8.1f} {1000 * percentile(values, 99):>8.1f} "
+                      f"{1000 * sum(values):>10.1f}")
+        
+        by_format = {}
+        for record in records:
+            by_format.setdefault(record.get('format', '?'), []).append(record['total'])
+        print(f"\n  {'format':<16} {'count':>8} {'p50':>8} {'p90':>8}")
+        for fmt, values in sorted(by_format.items()):
+            print(f"  {fmt:<16} {len(values):>8} {1000 * percentile(values, 50):>8.1f} "
+                  f"{1000 * percentile(values, 90):>8.1f}")
+        print(f"\n  Peak RSS: {max(r['process_peak_rss_mb'] for r in records):.1f} MB")
+        grew = max(records, key=lambda r: r['peak_rss_growth_mb'])
+        if grew['peak_rss_growth_mb'] > 0:
+            print(f"  Largest peak increase: {grew['peak_rss_growth_mb']:.1f} MB ({grew['source']})")
+        print(f"  Metrics written to: {self.metrics_path}")
+    
+    def settings_for(self, img_path):
+        """Effective settings that determine the bytes of a source's outputs"""
+        return {
+            'target_size': list(self.target_size),
+            'thumb_size': list(self.thumb_size),
+            'quality': self.quality,
+            'crop': self.crop_regions.get(self.source_key(img_path), self.crop_strategy),
+            'fast_load': self.fast_load,
+            'tile_threshold': self.tile_threshold,
+            'formats': self.formats,
+            'best_format': self.best_format,
+            'placeholders': self.placeholders,
+            'variants': self.variants,
+            'thumb_variants': self.thumb_variants,
+            'target_kb': self.target_kb,
+            'target_ssim': self.target_ssim,
+        }
+    
+    def load_manifest(self):
+        """Load the output manifest, starting fresh if missing or unreadable"""
+        try:
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                return data.get('entries', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+    
+    def save_manifest(self, entries):
+        """Atomically write the output manifest"""
+        write_json(self.manifest_path, {'version': MANIFEST_VERSION, 'entries': entries})
+    
+    def load_quality_cache(self):
+        """Load cached quality search results, keyed by quality_cache_key"""
+        try:
+            with open(self.quality_cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_quality_cache(self, manifest):
+        """Write the quality cache, dropping results for sources no longer
+        present in the manifest"""
+        live = {entry['source_hash'] for entry in manifest.values()}
+        cache = {key: value for key, value in self.quality_cache.items()
+                 if json.loads(key)[0] in live}
+        write_json(self.quality_cache_path, cache)
+    
+    def report_savings(self, manifest):
+        """Print gallery-wide bytes saved by adaptive quality vs fixed quality"""
+        adaptive = [o for entry in manifest.values()
+                    for o in entry.get('variants', []) if 'baseline_bytes' in o]
+        if not adaptive:
+            return
+        actual = sum(o['bytes'] for o in adaptive)
+        baseline = sum(o['baseline_bytes'] for o in adaptive)
+        saved = baseline - actual
+        print(f"Adaptive quality: {len(adaptive)} images, {actual / 1024:.1f} KB vs "
+              f"{baseline / 1024:.1f} KB at quality {self.quality} "
+              f"(saved {saved / 1024:.1f} KB, {100 * saved / max(baseline, 1):.1f}%)")
+    
+    def save_variants_index(self, entries):
+        """Write the srcset index of every output, keyed by output stem.
+        
+        Alongside the raw output lists, `picture` and `picture_thumbnails`
+        hold ready-made <source> type/srcset pairs, best codec first.
+        """
+        index = {}
+        for name, entry in entries.items():
+            stem = Path(name).with_suffix('').as_posix()
+            outputs = entry.get('variants', [])
+            images = [o for o in outputs if not o['path'].startswith('thumbnails/')]
+            thumbnails = [o for o in outputs if o['path'].startswith('thumbnails/')]
+            index[stem] = {
+                'source': name,
+                'images': images,
+                'thumbnails': thumbnails,
+                'picture': picture_sources(images),
+                'picture_thumbnails': picture_sources(thumbnails),
+            }
+        write_json(self.output_dir / VARIANTS_INDEX_NAME, index)
+    
+    def save_placeholders_index(self, entries):
+        """Write every image's placeholder and size, keyed by output name"""
+        index = {}
+        for entry in entries.values():
+            placeholder = entry.get('placeholder')
+            if not placeholder:
+                continue
+            base = entry['outputs'][0]
+            output = next(o for o in entry['variants'] if o['path'] == base)
+            index[base] = {'width': output['width'], 'height': output['height'], **placeholder}
+        write_json(self.output_dir / PLACEHOLDERS_NAME, index)
+    
+    @staticmethod
+    def source_digest(img_path, entry=None):
+        """SHA-256 of a source file, reusing the cached hash when the file's
+        size and mtime are unchanged since the last run"""
+        stat = img_path.stat()
+        if entry and entry.get('size') == stat.st_size \
+                and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['source_hash'], stat
+        digest = hashlib.sha256()
+        with open(img_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest(), stat
+    
+    def is_up_to_date(self, img_path, entry, source_hash):
+        """True if the manifest entry matches the source and all outputs exist"""
+        if self.force or not entry or entry.get('source_hash') != source_hash:
+            return False
+        if entry.get('settings') != self.settings_for(img_path):
             return False
+        return all((self.output_dir / name).exists() for name in entry.get('outputs', []))
+    
+    def remove_outputs(self, names, keep=()):
+        """Delete previously generated outputs, except those in `keep`"""
+        for name in names:
+            if name in keep:
+                continue
+            try:
+                (self.output_dir / name).unlink()
+                print(f"  Removed stale output: {name}")
+            except FileNotFoundError:
+                pass
+    
+    def prune_orphans(self, manifest, current):
+        """Drop manifest entries (and their outputs) whose source is gone.
+        
+        `current` is the set of source keys seen in this run; entries only
+        hidden by --include/--exclude or a non-recursive scan are kept as
+        long as the source file still exists. Outputs still claimed by a
+        live entry (e.g. photo.jpg replaced by photo.png) are left in place.
+        """
+        orphans = [name for name in manifest
+                   if name not in current and not (self.input_dir / name).is_file()]
+        entries = [manifest.pop(name) for name in orphans]
+        live = {path for entry in manifest.values() for path in entry.get('outputs', [])}
+        for entry in entries:
+            self.remove_outputs(entry.get('outputs', []), keep=live)
+        return len(orphans)
+    
+    def run_batch(self, images):
+        """Process images serially or across a process pool.
+
+        Yields (img_path, result) pairs in input order, where result is the
+        list of outputs written or False on failure. In parallel mode each
+        worker's log output is buffered and printed with its result so the
+        console reads the same as a serial run.
+        """
+        if self.jobs == 1 or len(images) < 2:
+            for img_path in images:
+                yield img_path, self.process_image(img_path)
+            return
+
+        workers = min(self.jobs, len(images))
+        # The converter is sent to each worker once rather than with every task
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self, Image.MAX_IMAGE_PIXELS)) as pool:
+            results = pool.map(_process_image_buffered, images)
+            for img_path, (result, log, records) in zip(images, results):
+                print(log, end='')
+                self.metrics_records.extend(records)
+                yield img_path, result
+    
+    def run_pipeline(self, images):
+        """Process a stream of images through threaded decode, transform and
+        encode stages connected by bounded queues.
+        
+        Pillow releases the GIL while decoding, resizing and encoding, so
+        encoding image N overlaps decoding image N+1, while the queue depth
+        caps how many decoded images are held in memory. `images` may be a
+        lazy iterator; paths are consumed as the first stage has room.
+        Yields (img_path, result) pairs in input order, like run_batch.
+        """
+        def decode(item):
+            print(f"\nProcessing: {self.source_key(item.path)}")
+            item.metrics = self.start_metrics(item.path)
+            return self.decode_image(item.path)
+        
+        def transform(item):
+            return self.transform_image(item.path, *item.data)
+        
+        def encode(item):
+            return self.encode_outputs(item.path, item.data)
+        
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in range(4)]
+        errors = []
+        
+        def discover():
+            try:
+                for img_path in images:
+                    queues[0].put(_PipelineItem(img_path))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                queues[0].put(None)
+        
+        router = _ThreadOutput(sys.stdout)
+        threads = [threading.Thread(target=discover, daemon=True)]
+        for func, inbox, outbox in zip((decode, transform, encode), queues, queues[1:]):
+            threads.append(threading.Thread(
+                target=_run_stage, args=(func, inbox, outbox, router), daemon=True))
+        
+        with redirect_stdout(router):
+            for thread in threads:
+                thread.start()
+            while True:
+                item = queues[-1].get()
+                if item is None:
+                    break
+                print(item.log.getvalue(), end='')
+                self.finish_metrics(item.metrics, item.data)
+                yield item.path, item.data or False
+        
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    
+    def iter_images(self):
+        """Yield supported images from a single os.scandir pass.
+        
+        Suffixes match case-insensitively. In recursive mode subdirectories
+        are walked depth-first (skipping the output directory); include and
+        exclude glob patterns are matched against the path relative to
+        input_dir, and exclude patterns also prune whole directories.
+        Paths are yielded as they are found, so callers can start work
+        before the scan finishes.
+        """
+        output_dir = self.output_dir.resolve()
+        stack = [self.input_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as e:
+                print(f"Warning: cannot scan {directory}: {e}")
+                continue
+            subdirs = []
+            with entries:
+                for entry in entries:
+                    path = Path(entry.path)
+                    rel_path = path.relative_to(self.input_dir).as_posix()
+                    if self.excluded(rel_path):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if self.recursive and path.resolve() != output_dir:
+                                subdirs.append(path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in self.supported_formats:
+                        continue
+                    if self.include and not any(fnmatch(rel_path, p) for p in self.include):
+                        continue
+                    yield path
+            # Reverse so directories are visited in scan order
+            stack.extend(reversed(subdirs))
+    
+    def excluded(self, rel_path):
+        """True if a relative path matches any exclude pattern"""
+        return any(fnmatch(rel_path, p) or fnmatch(os.path.basename(rel_path), p)
+                   for p in self.exclude)
+    
+    def source_key(self, img_path):
+        """Source path relative to input_dir, used as the manifest key"""
+        return img_path.relative_to(self.input_dir).as_posix()
+    
+    def output_stem(self, img_path):
+        """Output path stem; subdirectories are mirrored in recursive mode"""
+        return Path(self.source_key(img_path)).with_suffix('').as_posix()
+
+    @staticmethod
+    def perceptual_hash(img_path):
+        """64-bit difference hash (dHash) from a tiny decode of the source.
+        
+        Returns (hash, pixel_count); JPEGs decode at 1/8 scale via draft.
+        """
+        register_heif(img_path)
+        img = Image.open(img_path)
+        pixels = img.width * img.height
+        img.draft('L', (64, 64))
+        from PIL import ImageOps
+        img = ImageOps.exif_transpose(img)
+        small = img.convert('L').resize((9, 8), Image.Resampling.BOX)
+        data = small.tobytes()
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                value = (value << 1) | (data[row * 9 + col] > data[row * 9 + col + 1])
+        return value, pixels
+    
+    def find_duplicates(self, images, manifest, hashes):
+        """Group near-duplicate sources by perceptual hash.
+        
+        Hashes are cached by source content hash, so only new or changed
+        files are decoded. Sources are indexed in a BK-tree from the highest
+        resolution (then largest file) down, so each group's canonical copy
+        is its best source.
+        Fills `hashes` with source digests as a side effect.
+        Returns {duplicate key: (canonical key, distance)}.
+        """
+        cache_path = self.output_dir / PHASH_CACHE_NAME
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        
+        keys = [self.source_key(img_path) for img_path in images]
+        for key, img_path in zip(keys, images):
+            hashes[key] = self.source_digest(img_path, manifest.get(key))
+        
+        def compute(img_path):
+            try:
+                return self.perceptual_hash(img_path)
+            except Exception as e:
+                print(f"  Warning: cannot hash {img_path.name}: {e}")
+                return None
+        
+        todo = [(key, img_path) for key, img_path in zip(keys, images)
+                if hashes[key][0] not in cache]
+        # Decoders release the GIL, so threads are enough for tiny decodes
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for (key, _), result in zip(todo, pool.map(compute, [p for _, p in todo])):
+                if result is not None:
+                    cache[hashes[key][0]] = [f"{result[0]:016x}", result[1]]
+        
+        live = {hashes[key][0] for key in keys}
+        write_json(cache_path, {digest: value for digest, value in cache.items() if digest in live})
+        
+        entries = [(key, int(cache[hashes[key][0]][0], 16), cache[hashes[key][0]][1],
+                    hashes[key][1].st_size)
+                   for key in keys if hashes[key][0] in cache]
+        entries.sort(key=lambda e: (-e[2], -e[3], e[0]))
+        
+        tree = BKTree()
+        duplicates = {}
+        for key, value, _, _ in entries:
+            match = tree.find(value, self.dedupe_distance)
+            if match:
+                duplicates[key] = match
+            else:
+                tree.add(value, key)
+        return duplicates
+    
+    def report_duplicates(self, duplicates):
+        """Print near-duplicate groups and write them to duplicates.json"""
+        groups = {}
+        for key, (canonical, distance) in sorted(duplicates.items()):
+            groups.setdefault(canonical, []).append({'source': key, 'distance': distance})
+        write_json(self.output_dir / DUPLICATES_NAME, groups)
+        if not groups:
+            print("Near-duplicates: none")
+            return
+        action = 'skipping' if self.dedupe == 'skip' else 'reporting only'
+        print(f"Near-duplicates: {len(duplicates)} in {len(groups)} groups ({action})")
+        for canonical, copies in sorted(groups.items()):
+            print(f"  {canonical}: " + ", ".join(f"{c['source']} (d={c['distance']})" for c in copies))
+    
+    def record_result(self, manifest, img_path, rendered, source_hash, stat):
+        """Record a successful conversion in the manifest and quality cache,
+        removing outputs of the previous conversion that weren't rewritten"""
+        key = self.source_key(img_path)
+        placeholder = next((o.pop('placeholder') for o in rendered if 'placeholder' in o), None)
+        outputs = [o['path'] for o in rendered]
+        previous = manifest.get(key)
+        if previous:
+            self.remove_outputs(previous.get('outputs', []), keep=outputs)
+        manifest[key] = {
+            'source_hash': source_hash,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'settings': self.settings_for(img_path),
+            'outputs': outputs,
+            'variants': rendered,
+        }
+        if placeholder:
+            manifest[key]['placeholder'] = placeholder
+        # Only base images whose quality was searched carry a baseline
+        for base in rendered:
+            if 'baseline_bytes' in base:
+                self.quality_cache[self.quality_cache_key(img_path, base['format'])] = {
+                    'quality': base['quality'],
+                    'baseline_bytes': base['baseline_bytes'],
+                }
+    
+    def save_state(self, manifest):
+        """Write the manifest, variants index, quality cache and metrics"""
+        self.save_manifest(manifest)
+        self.save_variants_index(manifest)
+        if self.placeholders:
+            self.save_placeholders_index(manifest)
+        if self.adaptive:
+            self.save_quality_cache(manifest)
+        if self.metrics_path:
+            self.write_metrics()
+        if self.sprites:
+            self.build_sprites(manifest)
+    
+    def build_sprites(self, manifest):
+        """Pack base thumbnails into sprite atlases with a JSON and CSS offset map.
+        
+        Entries are keyed by the gallery filename the portfolio XML uses
+        (the thumbnail's name without thumbnails/). Thumbnails keep their
+        atlas slot from run to run and freed slots are reused, so only
+        atlases whose members were added, removed or rewritten are encoded
+        again. Atlas filenames carry a content hash for long-lived caching.
+        """
+        sprites_dir = self.output_dir / SPRITES_DIR
+        index_path = sprites_dir / SPRITES_INDEX_NAME
+        fmt = self.formats[0]
+        suffix = CODECS[fmt][1]
+        cell = max(self.thumb_size)
+        layout = {'cell': cell, 'columns': SPRITE_COLUMNS, 'size': self.sprite_size, 'format': fmt}
+        
+        # Current base thumbnails and their (mtime_ns, size) signatures. With
+        # --best-format each image's thumbnail may be in any codec, so take
+        # the first of --formats it was written in.
+        thumbs = {}
+        for name, entry in manifest.items():
+            stem = f"thumbnails/{self.output_stem(self.input_dir / name)}"
+            outputs = entry.get('outputs', [])
+            thumb = next((stem + CODECS[f][1] for f in self.formats if stem + CODECS[f][1] in outputs), None)
+            if thumb:
+                try:
+                    stat = (self.output_dir / thumb).stat()
+                except OSError:
+                    continue
+                thumbs[thumb[len('thumbnails/'):]] = [stat.st_mtime_ns, stat.st_size]
+        
+        try:
+            with open(index_path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        if previous.get('layout') != layout:
+            previous = {}
+        atlases = [{'file': a['file'], 'slots': list(a['slots'])} for a in previous.get('atlases', [])]
+        old_images = previous.get('images', {})
+        
+        # Free the slots of removed or changed thumbnails and mark atlases to redraw
+        dirty = set()
+        for i, atlas in enumerate(atlases):
+            for slot, name in enumerate(atlas['slots']):
+                if name is None:
+                    continue
+                if name not in thumbs or old_images.get(name, {}).get('signature') != thumbs[name]:
+                    dirty.add(i)
+                    if name not in thumbs:
+                        atlas['slots'][slot] = None
+            if not (sprites_dir / atlas['file']).exists():
+                dirty.add(i)
+        placed = {name for atlas in atlases for name in atlas['slots'] if name}
+        for name in sorted(set(thumbs) - placed):
+            for i, atlas in enumerate(atlases):
+                if None in atlas['slots']:
+                    atlas['slots'][atlas['slots'].index(None)] = name
+                    break
+                if len(atlas['slots']) < self.sprite_size:
+                    atlas['slots'].append(name)
+                    break
+            else:
+                i = len(atlases)
+                atlases.append({'file': None, 'slots': [name]})
+            dirty.add(i)
+        
+        sprites_dir.mkdir(exist_ok=True)
+        images = {}
+        for i, atlas in enumerate(atlases):
+            while atlas['slots'] and atlas['slots'][-1] is None:
+                atlas['slots'].pop()
+            sizes = self.draw_atlas(sprites_dir, i, atlas, cell, fmt) if i in dirty else {}
+            for slot, name in enumerate(atlas['slots']):
+                if name is None:
+                    continue
+                width, height = sizes.get(name) or (old_images[name]['width'], old_images[name]['height'])
+                images[name] = {
+                    'atlas': atlas['file'],
+                    'x': (slot % SPRITE_COLUMNS) * cell,
+                    'y': (slot // SPRITE_COLUMNS) * cell,
+                    'width': width,
+                    'height': height,
+                    'signature': thumbs[name],
+                }
+        rebuilt = len([i for i in dirty if atlases[i]['slots']])
+        atlases = [a for a in atlases if a['slots']]
+        for stale in sprites_dir.glob(f"thumbs-*{suffix}"):
+            if stale.name not in {a['file'] for a in atlases}:
+                stale.unlink()
+        
+        write_json(index_path, {
+            'layout': layout,
+            'atlases': [{'file': a['file'], 'slots': a['slots']} for a in atlases],
+            'images': images,
+        })
+        (sprites_dir / SPRITES_CSS_NAME).write_text(sprite_css(images))
+        print(f"Sprites: {len(images)} thumbnails in {len(atlases)} atlas(es), "
+              f"{rebuilt} rebuilt")
+    
+    def draw_atlas(self, sprites_dir, number, atlas, cell, fmt):
+        """Paste an atlas's thumbnails into their grid cells and write it.
+        
+        Removes the atlas's previous file, records the new (hashed) name in
+        atlas['file'] and returns each thumbnail's (width, height).
+        """
+        rows = -(-len(atlas['slots']) // SPRITE_COLUMNS)
+        columns = min(len(atlas['slots']), SPRITE_COLUMNS)
+        canvas = Image.new('RGB', (max(1, columns) * cell, max(1, rows) * cell), (255, 255, 255))
+        sizes = {}
+        for slot, name in enumerate(atlas['slots']):
+            if name is None:
+                continue
+            with Image.open(self.output_dir / 'thumbnails' / name) as thumb:
+                canvas.paste(thumb.convert('RGB'), ((slot % SPRITE_COLUMNS) * cell, (slot // SPRITE_COLUMNS) * cell))
+                sizes[name] = thumb.size
+        data = self.encode_as(canvas, fmt, self.quality)
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        if atlas['file']:
+            (sprites_dir / atlas['file']).unlink(missing_ok=True)
+        atlas['file'] = f"thumbs-{number}-{digest}{CODECS[fmt][1]}"
+        (sprites_dir / atlas['file']).write_bytes(data)
+        return sizes
+    
+    def snapshot(self):
+        """Map each supported source to its (mtime_ns, size), without hashing"""
+        signatures = {}
+        for img_path in self.iter_images():
+            try:
+                stat = img_path.stat()
+            except OSError:
+                continue
+            signatures[img_path] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+    
+    def watch(self, interval=WATCH_INTERVAL, settle=WATCH_SETTLE):
+        """Convert new or changed sources as they arrive, until interrupted.
+        
+        After a normal catch-up run, the input directory is polled with the
+        same single-pass scan, comparing only sizes and mtimes. A file is
+        converted once both have held still for `settle` seconds, so files
+        still being copied in are never read half-written. Conversions go to
+        a pool of long-lived workers (or run inline with --jobs 1), and the
+        manifest and indexes are saved after each one. Sources that
+        disappear have their outputs pruned.
+        """
+        # Snapshot before the catch-up run, so files that land while it is
+        # converting still differ from `known` and go through start()
+        known = self.snapshot()
+        self.process_directory()
+        self.metrics_records.clear()
+        manifest = self.load_manifest()
+        if self.adaptive:
+            self.quality_cache = self.load_quality_cache()
+        
+        # Changed files waiting to settle: path -> (signature, first seen)
+        pending = {}
+        # In-flight pool conversions: future -> (path, source_hash, stat)
+        running = {}
+        pool = None
+        if self.jobs > 1:
+            pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                       initargs=(self, Image.MAX_IMAGE_PIXELS))
+        
+        def finish(img_path, rendered, source_hash, stat):
+            if rendered:
+                self.record_result(manifest, img_path, rendered, source_hash, stat)
+                self.save_state(manifest)
+                self.metrics_records.clear()
+        
+        def start(img_path):
+            key = self.source_key(img_path)
+            try:
+                source_hash, stat = self.source_digest(img_path, manifest.get(key))
+            except OSError:
+                return  # Gone again before we got to it
+            if self.is_up_to_date(img_path, manifest.get(key), source_hash):
+                print(f"\nUnchanged: {key}")
+                return
+            self.source_hashes[key] = source_hash
+            if pool is None:
+                finish(img_path, self.process_image(img_path), source_hash, stat)
+            else:
+                future = pool.submit(_process_image_buffered, img_path, source_hash)
+                running[future] = (img_path, source_hash, stat)
+        
+        print(f"\nWatching {self.input_dir} for changes (Ctrl+C to stop)...")
+        try:
+            while True:
+                now = time.monotonic()
+                current = self.snapshot()
+                for img_path, signature in current.items():
+                    if known.get(img_path) == signature:
+                        continue
+                    seen = pending.get(img_path)
+                    if seen is None or seen[0] != signature:
+                        pending[img_path] = (signature, now)
+                    elif now - seen[1] >= settle:
+                        del pending[img_path]
+                        known[img_path] = signature
+                        start(img_path)
+                
+                removed = [img_path for img_path in known if img_path not in current]
+                if removed:
+                    for img_path in removed:
+                        del known[img_path]
+                        pending.pop(img_path, None)
+                    pruned = self.prune_orphans(manifest, {self.source_key(p) for p in current})
+                    if pruned:
+                        print(f"\nRemoved: {pruned} source(s) deleted, outputs pruned")
+                        self.save_state(manifest)
+                
+                if not running:
+                    time.sleep(interval)
+                    continue
+                # Wait for results, but no longer than one poll interval
+                done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    img_path, source_hash, stat = running.pop(future)
+                    result, log, records = future.result()
+                    print(log, end='')
+                    self.metrics_records.extend(records)
+                    finish(img_path, result, source_hash, stat)
+        except KeyboardInterrupt:
+            print("\nStopping watch.")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            self.save_state(manifest)
     
     def process_directory(self):
         """Process all images in the input directory"""
-        # Find all supported images (case-insensitive)
-        images = []
-        for ext in self.supported_formats:
-            # Add both lowercase and uppercase versions
-            images.extend(self.input_dir.glob(f"*{ext}"))
-            images.extend(self.input_dir.glob(f"*{ext.upper()}"))
-            # Also try mixed case for HEIC (common on iOS)
-            if ext in ['.heic', '.heif']:
-                images.extend(self.input_dir.glob(f"*{ext.capitalize()}"))
-        
-        images = sorted(set(images))
-        
-        # Debug: Show what we found
-        if images:
-            print(f"\nFound files:")
-            for img in images:
-                print(f"  - {img.name} ({img.suffix})")
-        else:
-            print(f"\nNo files found. Checked extensions: {self.supported_formats}")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / "thumbnails").mkdir(exist_ok=True)
+        manifest = self.load_manifest()
         
-        if not images:
-            print(f"No supported images found in {self.input_dir}")
-            print(f"Supported formats: {', '.join(self.supported_formats)}")
-            return
+        if self.pipeline and not self.interactive and not self.dedupe:
+            # Stream paths straight into the pipeline as they're discovered
+            images = self.iter_images()
+        else:
+            images = sorted(self.iter_images())
+            
+            # Debug: Show what we found
+            if images:
+                print(f"\nFound files:")
+                for img in images:
+                    print(f"  - {self.source_key(img)} ({img.suffix})")
+            else:
+                print(f"\nNo files found. Checked extensions: {self.supported_formats}")
+            print(f"\nFound {len(images)} images to process")
         
-        print(f"\nFound {len(images)} images to process")
         print(f"Output directory: {self.output_dir}")
         print(f"Target size: {self.target_size[0]}x{self.target_size[1]}")
         print(f"Thumbnail size: {self.thumb_size[0]}x{self.thumb_size[1]}")
         print(f"Interactive mode: {'ON' if self.interactive else 'OFF'}")
+        print(f"Saved crops: {len(self.crop_regions)}")
+        if self.pipeline:
+            print(f"Pipeline mode: ON (queue depth {self.queue_depth})")
+        else:
+            print(f"Worker processes: {self.jobs}")
+        
+        hashes = {}
         
-        if self.interactive:
-            input("\nPress Enter to start interactive processing...")
+        # Near-duplicate pre-pass over the whole batch
+        if self.dedupe:
+            duplicates = self.find_duplicates(images, manifest, hashes)
+            self.report_duplicates(duplicates)
+            if self.dedupe == 'skip':
+                images = [p for p in images if self.source_key(p) not in duplicates]
+                # Outputs from earlier runs of a now-skipped copy are dead weight
+                for key in duplicates:
+                    if key in manifest:
+                        self.remove_outputs(manifest.pop(key).get('outputs', []))
+        
+        # Pick any missing crops first; conversion itself is always headless
+        if self.interactive and not self.run_crop_picker(images):
+            print("\nCropping stopped; choices so far are saved in the crop file.")
+            return
+        
+        # Skip sources whose outputs are already up to date
+        seen = set()
+        up_to_date = 0
+        if self.adaptive:
+            self.quality_cache = self.load_quality_cache()
+        
+        def pending_images():
+            nonlocal up_to_date
+            for img_path in images:
+                key = self.source_key(img_path)
+                seen.add(key)
+                entry = manifest.get(key)
+                if key not in hashes:
+                    hashes[key] = self.source_digest(img_path, entry)
+                if self.is_up_to_date(img_path, entry, hashes[key][0]):
+                    up_to_date += 1
+                else:
+                    self.source_hashes[key] = hashes[key][0]
+                    yield img_path
+        
+        if self.pipeline:
+            results = self.run_pipeline(pending_images())
+        else:
+            pending = list(pending_images())
+            print(f"Up to date (skipped): {up_to_date} | To convert: {len(pending)}")
+            results = self.run_batch(pending)
         
-        # Process each image
+        # Process each image, recording successes in the manifest as we go
         processed = 0
-        for img_path in images:
-            if self.process_image(img_path):
+        attempted = 0
+        try:
+            for img_path, rendered in results:
+                attempted += 1
+                if not rendered:
+                    continue
                 processed += 1
+                self.record_result(manifest, img_path, rendered, *hashes[self.source_key(img_path)])
+            pruned = self.prune_orphans(manifest, seen)
+        finally:
+            self.save_state(manifest)
+        
+        if not seen:
+            print(f"No supported images found in {self.input_dir}")
+            print(f"Supported formats: {', '.join(self.supported_formats)}")
+            return
         
         print(f"\n{'='*60}")
         print(f"Conversion complete!")
-        print(f"Successfully processed: {processed}/{len(images)} images")
+        print(f"Successfully processed: {processed}/{attempted} images")
+        print(f"Up to date (skipped): {up_to_date} | Orphans pruned: {pruned}")
+        if self.adaptive:
+            self.report_savings(manifest)
+        if self.metrics_path:
+            self.print_metrics_summary()
         print(f"Output location: {self.output_dir.absolute()}")
         print(f"{'='*60}\n")
 
 
+def convert_image(source, name=None, crop_box=None, **options):
+    """Convert one image in memory, without reading or writing any files.
+
+    `source` is bytes, a binary file object or a path. `name` is the
+    source's relative path, which the output paths are derived from
+    (default: the path's file name, or 'image.jpg'). `crop_box` is an
+    optional (left, top, right, bottom) region in full-resolution pixels,
+    as in the crop file; otherwise the `crop` strategy applies. Other
+    keyword arguments are ImageConverter options (target_size, quality,
+    formats, variants, placeholders, ...).
+
+    Returns {'width', 'height', 'outputs', 'placeholder'}: the source's
+    oriented size, a list of {path, format, width, height, bytes, quality,
+    data} dicts holding the encoded bytes, and the placeholder (or None).
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        fp = io.BytesIO(source)
+    elif hasattr(source, 'read'):
+        fp = source
+    else:
+        fp = None
+        name = name or Path(source).name
+    img_path = Path(name or 'image.jpg')
+
+    crops = {img_path.as_posix(): {'box': list(crop_box)}} if crop_box else {}
+    options.setdefault('log', lambda *args, **kwargs: None)
+    converter = ImageConverter('.', '.', crops=crops, **options)
+
+    decoded = converter.decode_image(img_path, source if fp is None else fp)
+    if decoded is None:
+        raise RuntimeError(f"Can't decode {img_path} (HEIC/HEIF needs pillow-heif)")
+    img, full_size = decoded
+    outputs = converter.encode_renders(img_path, converter.transform_image(img_path, img, full_size))
+    return {
+        'width': full_size[0],
+        'height': full_size[1],
+        'outputs': outputs,
+        'placeholder': outputs[0].pop('placeholder', None),
+    }
+
+
+def write_json(path, data):
+    """Write JSON via a temporary file so readers never see a partial file"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def sprite_css(images):
+    """CSS rules placing each sprite, selected by [data-thumb="<filename>"]"""
+    lines = ['/* Generated by convert_images.py --sprites; do not edit. */']
+    for name, sprite in sorted(images.items()):
+        selector = name.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(
+            f'[data-thumb="{selector}"] {{ background: url("{sprite["atlas"]}") '
+            f'{-sprite["x"]}px {-sprite["y"]}px no-repeat; '
+            f'width: {sprite["width"]}px; height: {sprite["height"]}px; }}')
+    return '\n'.join(lines) + '\n'
+
+
+def make_placeholder(img):
+    """BlurHash, dominant colour and an inline tiny WebP for an image"""
+    sample = img.copy()
+    sample.thumbnail((BLURHASH_SAMPLE, BLURHASH_SAMPLE), Image.Resampling.BOX)
+    
+    # Most common colour of a 4-colour quantisation of the sample
+    palette = sample.quantize(4)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[3 * index:3 * index + 3]
+    
+    tiny = sample.copy()
+    tiny.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.Resampling.LANCZOS)
+    data = ImageConverter.encode_as(tiny, 'webp', LQIP_QUALITY)
+    return {
+        'blurhash': blurhash(sample, *BLURHASH_COMPONENTS),
+        'color': f"#{red:02x}{green:02x}{blue:02x}",
+        'lqip': 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii'),
+    }
+
+
+def blurhash(img, x_components, y_components):
+    """Encode an RGB image as a BlurHash string (https://blurha.sh)"""
+    def to_linear(value):
+        value /= 255
+        return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    
+    def to_srgb(value):
+        value = max(0.0, min(1.0, value))
+        value = value * 12.92 if value <= 0.0031308 else 1.055 * value ** (1 / 2.4) - 0.055
+        return int(value * 255 + 0.5)
+    
+    def base83(value, length):
+        return ''.join(BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+    
+    width, height = img.size
+    srgb = [to_linear(v) for v in range(256)]
+    data = img.convert('RGB').tobytes()
+    pixels = [[srgb[data[k]], srgb[data[k + 1]], srgb[data[k + 2]]] for k in range(0, len(data), 3)]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+    
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            total = [0.0, 0.0, 0.0]
+            for y in range(height):
+                row = pixels[y * width:(y + 1) * width]
+                for x, pixel in enumerate(row):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    total[0] += basis * pixel[0]
+                    total[1] += basis * pixel[1]
+                    total[2] += basis * pixel[2]
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append([c * scale for c in total])
+    
+    dc, ac = factors[0], factors[1:]
+    result = base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, int(max(abs(c) for f in ac for c in f) * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1
+    result += base83(quantised_max, 1)
+    result += base83((to_srgb(dc[0]) << 16) + (to_srgb(dc[1]) << 8) + to_srgb(dc[2]), 4)
+    for factor in ac:
+        quantised = [max(0, min(18, int(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5)))
+                     for c in factor]
+        result += base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
+
+
+def picture_sources(outputs):
+    """Group outputs by codec into <picture> <source> entries, best first"""
+    by_format = {}
+    for output in sorted(outputs, key=lambda o: o['width'], reverse=True):
+        by_format.setdefault(output.get('format', 'webp'), []).append(output)
+    return [{
+        'type': CODECS[fmt][2],
+        'srcset': ', '.join(f"{o['path']} {o['width']}w" for o in by_format[fmt]),
+    } for fmt in CODECS if fmt in by_format]
+
+
+def flatten_rgb(img):
+    """Convert to RGB, compositing any transparency onto white"""
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+    if img.mode in ('RGBA', 'LA'):
+        # An RGBA/LA mask means "use its alpha band", so no split() copy
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def raw_strip_reader(img):
+    """Return read(top, bottom) decoding just those rows of an uncompressed
+    single-raster file, or None if the file isn't stored that way"""
+    if len(img.tile) != 1 or not img.filename:
+        return None
+    codec, extents, offset, args = img.tile[0]
+    if codec != 'raw' or tuple(extents) != (0, 0) + img.size:
+        return None
+    args = (args,) if isinstance(args, str) else tuple(args)
+    rawmode, stride, direction = (args + (0, 1)[len(args) - 1:])[:3]
+    if not stride:
+        try:
+            stride = len(Image.new(rawmode, (img.width, 1)).tobytes())
+        except ValueError:
+            return None
+    path, mode, width, height = img.filename, img.mode, img.width, img.height
+    
+    def read(top, bottom):
+        # Bottom-up rasters (BMP) store the last row first
+        first_row = top if direction > 0 else height - bottom
+        with open(path, 'rb') as f:
+            f.seek(offset + first_row * stride)
+            data = f.read((bottom - top) * stride)
+        return Image.frombytes(mode, (width, bottom - top), data, 'raw', rawmode, stride, direction)
+    
+    return read
+
+
+def window_entropy(img, window, horizontal):
+    """Shannon entropy of every `window`-wide slice of a grayscale image.
+    
+    Per-column 32-bin histograms are prefix-summed so each window's
+    histogram is a single subtraction.
+    """
+    gray = np.asarray(img.convert('L'))
+    if not horizontal:
+        gray = gray.T
+    bins = 32
+    columns = np.broadcast_to(np.arange(gray.shape[1]), gray.shape)
+    counts = np.bincount((columns * bins + gray // (256 // bins)).ravel(),
+                         minlength=gray.shape[1] * bins).reshape(gray.shape[1], bins)
+    cumulative = np.vstack([np.zeros((1, bins)), counts.cumsum(axis=0)])
+    hist = cumulative[window:] - cumulative[:-window]
+    p = hist / hist.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.nansum(p * np.log2(p), axis=1)
+
+
+def window_saliency(img, window, horizontal):
+    """Total saliency of every `window`-wide slice of an image.
+    
+    Frequency-tuned saliency: distance of each lightly blurred pixel from
+    the image's mean colour, plus gradient magnitude for edge energy.
+    """
+    from PIL import ImageFilter
+    rgb = np.asarray(img.filter(ImageFilter.GaussianBlur(1)), dtype=np.float32)
+    saliency = np.linalg.norm(rgb - rgb.mean(axis=(0, 1)), axis=2)
+    gray = rgb.mean(axis=2)
+    gy, gx = np.gradient(gray)
+    saliency += np.hypot(gx, gy)
+    profile = saliency.sum(axis=0 if horizontal else 1)
+    cumulative = np.concatenate([[0.0], profile.cumsum()])
+    return cumulative[window:] - cumulative[:-window]
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+    
+    Nodes are [value, key, {distance: child}]; a radius query only descends
+    into children whose edge distance is within the radius of the query's
+    distance to the node (triangle inequality), avoiding O(n^2) scans.
+    """
+    def __init__(self):
+        self.root = None
+    
+    @staticmethod
+    def distance(a, b):
+        return bin(a ^ b).count('1')
+    
+    def add(self, value, key):
+        if self.root is None:
+            self.root = [value, key, {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(value, node[0])
+            if d not in node[2]:
+                node[2][d] = [value, key, {}]
+                return
+            node = node[2][d]
+    
+    def find(self, value, radius):
+        """Closest (key, distance) within radius, or None"""
+        best = None
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = self.distance(value, node[0])
+            if d <= radius and (best is None or d < best[1]):
+                best = (node[1], d)
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return best
+
+
+def ssim(reference, img, window=8):
+    """Mean SSIM between a grayscale float array and an image.
+    
+    Uses uniform windows computed from integral images, which is plenty
+    for ranking encodes of the same picture against each other.
+    """
+    other = np.asarray(img.convert('L'), dtype=np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    area = window * window
+    
+    def window_mean(x):
+        s = np.pad(x.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        return (s[window:, window:] - s[:-window, window:]
+                - s[window:, :-window] + s[:-window, :-window]) / area
+    
+    mu_a, mu_b = window_mean(reference), window_mean(other)
+    var_a = window_mean(reference * reference) - mu_a ** 2
+    var_b = window_mean(other * other) - mu_b ** 2
+    cov = window_mean(reference * other) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / \
+        ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+class _PipelineItem:
+    """One image moving through the pipeline, with its buffered log"""
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.failed = False
+        self.log = io.StringIO()
+        self.metrics = None
+
+
+class _ThreadOutput(io.TextIOBase):
+    """stdout proxy that sends each pipeline thread's prints to the log of
+    the item it is working on, so output can be replayed in order"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+    
+    def flush(self):
+        self.stream.flush()
+
+
+def _run_stage(func, inbox, outbox, router):
+    """Pipeline worker thread: apply `func` to each item until the sentinel"""
+    while True:
+        item = inbox.get()
+        if item is None:
+            outbox.put(None)
+            return
+        if not item.failed:
+            router.local.buffer = item.log
+            _metrics_local.record = item.metrics
+            try:
+                item.data = func(item)
+                item.failed = item.data is None
+            except Exception as e:
+                print(f"  ✗ Error: {str(e)}")
+                item.data, item.failed = None, True
+            finally:
+                router.local.buffer = None
+                _metrics_local.record = None
+        outbox.put(item)
+
+
+_worker_converter = None
+
+# The metrics record of the image the current thread is working on
+_metrics_local = threading.local()
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process so far, in MB. With
+    `children`, the larger of that and the biggest finished child process's
+    peak (e.g. --jobs workers once the pool has shut down)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _init_worker(converter, max_image_pixels):
+    """Pool initializer: keep this worker's copy of the converter"""
+    global _worker_converter
+    _worker_converter = converter
+    # Spawned workers don't inherit a raised --max-megapixels limit
+    Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+
+def _process_image_buffered(img_path, source_hash=None):
+    """Pool worker: run process_image and capture its console output"""
+    if source_hash is not None:
+        # Long-lived --watch workers never see the parent's later hashes
+        _worker_converter.source_hashes[_worker_converter.source_key(img_path)] = source_hash
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        result = _worker_converter.process_image(img_path)
+    records, _worker_converter.metrics_records = _worker_converter.metrics_records, []
+    return result, buffer.getvalue(), records
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert images to normalized WebP format with thumbnails',
@@ -313,14 +2173,63 @@ Examples:
   # Basic conversion (auto-crop)
   python convert_images.py ./photos ./output
   
-  # Interactive cropping mode
+  # Pick crops interactively (saved to ./photos/crops.json), then convert
   python convert_images.py ./photos ./output --interactive
   
+  # Later runs reapply the saved crops headlessly, in parallel
+  python convert_images.py ./photos ./output --jobs 8
+  
   # Custom sizes
   python convert_images.py ./photos ./output --size 2560 1440 --thumb 300 300
   
   # High quality
   python convert_images.py ./photos ./output --quality 95
+  
+  # Stream through overlapped decode/resize/encode threads
+  python convert_images.py ./photos ./output --pipeline
+  
+  # Content-aware automatic crops instead of center crops
+  python convert_images.py ./photos ./output --crop saliency
+  
+  # Write WebP and AVIF for every image (variants.json lists <picture> sources)
+  python convert_images.py ./photos ./output --formats webp,avif
+  
+  # Keep only whichever of WebP/AVIF is smaller at the same SSIM
+  python convert_images.py ./photos ./output --formats webp,avif --best-format
+  
+  # Also pack thumbnails into sprite atlases (sprites/sprites.json + sprites.css)
+  python convert_images.py ./photos ./output --sprites
+  
+  # Emit placeholders.json (BlurHash, colour, inline preview, width/height)
+  python convert_images.py ./photos ./output --placeholders
+  
+  # Keep converting photos as they are dropped into ./photos
+  python convert_images.py ./photos ./output --watch -j 4
+  
+  # Convert a gigapixel panorama in bounded memory
+  python convert_images.py ./scans ./output --max-megapixels 2000 --tile-threshold 20
+  
+  # Record per-stage timings and print percentiles per stage and format
+  python convert_images.py ./photos ./output --metrics metrics.jsonl
+  
+  # Report near-duplicate sources, or skip all but the largest copy
+  python convert_images.py ./photos ./output --dedupe report
+  python convert_images.py ./photos ./output --dedupe skip --dedupe-distance 4
+  
+  # Search each image's quality to land near 120 KB
+  python convert_images.py ./photos ./output --target-kb 120
+  
+  # Walk subfolders, skipping any "raw" directories
+  python convert_images.py ./photos ./output --recursive --exclude 'raw'
+  
+  # Responsive srcset ladder plus 2x thumbnails
+  python convert_images.py ./photos ./output --variants 320 640 1920 --thumb-variants 400
+  
+  # Decode every source at full resolution
+  python convert_images.py ./photos ./output --no-fast-load
+  
+  # Rebuild everything, ignoring the incremental manifest
+  python convert_images.py ./photos ./output --force
         """
     )
     
@@ -332,11 +2241,78 @@ Examples:
                        default=[200, 200], help='Thumbnail size (default: 200 200)')
     parser.add_argument('--quality', type=int, default=85, 
                        help='WebP quality 1-100 (default: 85)')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--target-kb', type=float,
+                       help='Search per-image quality for the largest full image under this size')
+    target.add_argument('--target-ssim', type=float,
+                       help='Search per-image quality for the smallest full image at this SSIM (e.g. 0.95)')
+    parser.add_argument('--crop', choices=CROP_STRATEGIES, default='center',
+                       help='Automatic crop strategy when no crop is saved (default: center)')
+    parser.add_argument('--dedupe', choices=('report', 'skip'),
+                       help='Find near-duplicate sources by perceptual hash and report or skip them')
+    parser.add_argument('--dedupe-distance', type=int, default=6,
+                       help='Max Hamming distance between 64-bit hashes to count as a duplicate (default: 6)')
+    parser.add_argument('--metrics', metavar='FILE',
+                       help='Append per-image stage timings to FILE (.csv, otherwise JSON Lines)')
+    parser.add_argument('--profile-dump', metavar='FILE',
+                       help='Run under cProfile and write stats to FILE (main process only)')
     parser.add_argument('--interactive', '-i', action='store_true',
-                       help='Enable interactive cropping with arrow keys')
+                       help='Pick missing crops with arrow keys before converting')
+    parser.add_argument('--crops', metavar='FILE',
+                       help='Crop file to read and write (default: INPUT_DIR/crops.json)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                       help='Worker processes '
+                            '(default: 1, 0 = all CPU cores)')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Stream images through threaded decode/resize/encode stages')
+    parser.add_argument('--queue-depth', type=int, default=2,
+                       help='Images buffered between pipeline stages (default: 2)')
+    parser.add_argument('--recursive', '-r', action='store_true',
+                       help='Also convert images in subdirectories (mirrored in the output)')
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                       help='Only convert files whose relative path matches (repeatable)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                       help='Skip files or directories matching the pattern (repeatable)')
+    parser.add_argument('--force', action='store_true',
+                       help='Reconvert every image even if its outputs are up to date')
+    parser.add_argument('--variants', nargs='+', type=int, default=[], metavar='WIDTH',
+                       help='Extra image widths to render at the target aspect ratio')
+    parser.add_argument('--thumb-variants', nargs='+', type=int, default=[], metavar='SIZE',
+                       help='Extra square thumbnail sizes to render')
+    parser.add_argument('--no-fast-load', dest='fast_load', action='store_false',
+                       help='Always decode sources at full resolution')
+    
+    parser.add_argument('--formats', default='webp',
+                       help='Comma-separated output codecs: ' + ', '.join(reversed(list(CODECS))) +
+                            ' (default: webp)')
+    parser.add_argument('--best-format', action='store_true',
+                       help='Keep only the smallest of --formats per image at equal SSIM '
+                            '(the first format sets the bar; requires numpy)')
+    parser.add_argument('--sprites', action='store_true',
+                       help=f'Pack thumbnails into sprite atlases under {SPRITES_DIR}/ with a JSON/CSS offset map')
+    parser.add_argument('--sprite-size', type=int, default=SPRITE_SIZE, metavar='N',
+                       help=f'Thumbnails per sprite atlas (default: {SPRITE_SIZE})')
+    parser.add_argument('--placeholders', action='store_true',
+                       help=f'Write a BlurHash, dominant colour and tiny WebP per image to {PLACEHOLDERS_NAME}')
+    parser.add_argument('--watch', action='store_true',
+                       help='After converting, keep running and convert new or changed files as they arrive')
+    parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+                       help=f'Seconds between checks of the input folder (default: {WATCH_INTERVAL})')
+    parser.add_argument('--watch-settle', type=float, default=WATCH_SETTLE, metavar='SECONDS',
+                       help='Seconds a new file must stay unchanged before it is converted '
+                            f'(default: {WATCH_SETTLE})')
+    parser.add_argument('--tile-threshold', type=float, default=TILE_THRESHOLD / 1_000_000,
+                       metavar='MEGAPIXELS',
+                       help='Decode larger non-JPEG sources strip by strip to bound memory '
+                            f'(default: {TILE_THRESHOLD // 1_000_000}, 0 = never)')
+    parser.add_argument('--max-megapixels', type=float, metavar='MEGAPIXELS',
+                       help="Raise Pillow's decompression-bomb limit for gigapixel sources")
     
     args = parser.parse_args()
     
+    if args.max_megapixels:
+        Image.MAX_IMAGE_PIXELS = int(args.max_megapixels * 1_000_000)
+    
     # Validate directories
     if not Path(args.input_dir).exists():
         print(f"Error: Input directory '{args.input_dir}' does not exist")
@@ -349,10 +2325,50 @@ Examples:
         target_size=tuple(args.size),
         thumb_size=tuple(args.thumb),
         quality=args.quality,
-        interactive=args.interactive
+        interactive=args.interactive,
+        crops_path=args.crops,
+        jobs=args.jobs or os.cpu_count() or 1,
+        force=args.force,
+        fast_load=args.fast_load,
+        variants=args.variants,
+        thumb_variants=args.thumb_variants,
+        pipeline=args.pipeline,
+        queue_depth=args.queue_depth,
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        target_kb=args.target_kb,
+        target_ssim=args.target_ssim,
+        crop=args.crop,
+        dedupe=args.dedupe,
+        dedupe_distance=args.dedupe_distance,
+        metrics_path=args.metrics,
+        tile_threshold=int(args.tile_threshold * 1_000_000),
+        formats=[fmt.strip().lower() for fmt in args.formats.split(',') if fmt.strip()],
+        best_format=args.best_format,
+        sprites=args.sprites,
+        sprite_size=args.sprite_size,
+        placeholders=args.placeholders
     )
     
-    converter.process_directory()
+    if args.watch:
+        run = lambda: converter.watch(args.watch_interval, args.watch_settle)
+    else:
+        run = converter.process_directory
+    
+    if args.profile_dump:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            run()
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile_dump)
+            print(f"cProfile stats written to {args.profile_dump} "
+                  f"(view with: python -m pstats {args.profile_dump})")
+    else:
+        run()
 
 
 if __name__ == '__main__':
@@ -2,8 +2,13 @@
 """
 File renaming script that renames files according to a predefined mapping.
 Handles spaces in filenames by replacing them with underscores for matching.
+
+Renames are planned as a whole (chains ordered, swaps/cycles routed through
+temporary names), journaled to disk first, and can be resumed or rolled
+back if a run is interrupted.
 """
 
+import json
 import os
 import sys
 
@@ -65,72 +70,264 @@ RENAME_MAP = {
 }
 
 
+JOURNAL_NAME = '.rename-journal.jsonl'
+
+
 def normalize_filename(filename):
     """Replace spaces with underscores in filename for matching"""
     return filename.replace(' ', '_')
 
 
-def rename_files(directory='.', dry_run=True):
+def list_files(directory):
+    """Names of regular files directly inside a directory (one scan)"""
+    with os.scandir(directory) as entries:
+        return {entry.name for entry in entries if entry.is_file()}
+
+
+def order_moves(moves, taken):
     """
-    Rename files in the specified directory according to RENAME_MAP.
+    Order src -> dst moves so no rename overwrites a file still to be moved.
+    
+    Chains are emitted target-first (C->D before B->C before A->B); cycles
+    are broken by parking one file under a temporary name.
     
     Args:
-        directory: Directory containing files to rename (default: current directory)
-        dry_run: If True, only print what would be renamed without actually renaming
+        moves: Dict of source name -> target name (targets unique)
+        taken: Set of names already present, used to pick free temp names
+    Returns:
+        List of (src, dst) steps
     """
-    # Create a normalized lookup map
-    normalized_map = {}
-    for old_name, new_name in RENAME_MAP.items():
-        normalized_key = normalize_filename(old_name)
-        normalized_map[normalized_key] = (old_name, new_name)
+    pred = {dst: src for src, dst in moves.items()}
+    steps = []
+    visited = set()
     
-    renamed_count = 0
-    not_found = []
+    # Chains: start at moves whose target is free, then walk backwards
+    for src, dst in moves.items():
+        if dst in moves:
+            continue
+        steps.append((src, dst))
+        visited.add(src)
+        cur = src
+        while cur in pred:
+            steps.append((pred[cur], cur))
+            cur = pred[cur]
+            visited.add(cur)
     
-    print(f"{'DRY RUN - ' if dry_run else ''}Scanning directory: {directory}\n")
+    # Whatever is left forms cycles
+    counter = 0
+    for start in moves:
+        if start in visited:
+            continue
+        while True:
+            temp = f".rename-tmp-{counter}-{start}"
+            counter += 1
+            if temp not in taken:
+                break
+        steps.append((start, temp))
+        visited.add(start)
+        cur = start
+        while pred[cur] != start:
+            steps.append((pred[cur], cur))
+            cur = pred[cur]
+            visited.add(cur)
+        steps.append((temp, cur))
+    
+    return steps
+
+
+def plan_directory(directory, prefix='', rename_map=None):
+    """
+    Resolve RENAME_MAP (or another rename_map) against one directory listing.
     
-    # Get all files in directory
+    Returns:
+        (steps, skipped, matched_keys) where steps are (src, dst) paths
+        relative to the top-level directory, skipped lists
+        (filename, target, reason) and matched_keys is the set of
+        normalized map keys that matched a file.
+    """
+    rename_map = RENAME_MAP if rename_map is None else rename_map
+    normalized_map = {normalize_filename(old): new for old, new in rename_map.items()}
+    files = list_files(directory)
+    
+    moves = {}
+    targets = set()
+    skipped = []
+    matched = set()
+    for filename in sorted(files):
+        key = normalize_filename(filename)
+        if key not in normalized_map:
+            continue
+        matched.add(key)
+        new_name = normalized_map[key]
+        if new_name == filename:
+            continue
+        if new_name in targets:
+            skipped.append((prefix + filename, prefix + new_name, 'another file maps to the same target'))
+            continue
+        moves[filename] = new_name
+        targets.add(new_name)
+    
+    # A target that exists is only safe if that file is itself being moved
+    # away; dropping one move can block another, so repeat until stable
+    changed = True
+    while changed:
+        changed = False
+        for filename, new_name in list(moves.items()):
+            if new_name in files and new_name not in moves:
+                skipped.append((prefix + filename, prefix + new_name, 'target already exists'))
+                del moves[filename]
+                changed = True
+    
+    steps = [(prefix + src, prefix + dst) for src, dst in order_moves(moves, files)]
+    return steps, skipped, matched
+
+
+def plan_renames(directory, rename_map=None):
+    """Plan renames for a directory plus its thumbnails/ folder, if any"""
+    steps, skipped, matched = plan_directory(directory, rename_map=rename_map)
+    thumbs = os.path.join(directory, 'thumbnails')
+    if os.path.isdir(thumbs):
+        thumb_steps, thumb_skipped, _ = plan_directory(thumbs, 'thumbnails/', rename_map)
+        steps += thumb_steps
+        skipped += thumb_skipped
+    return steps, skipped, matched
+
+
+def write_journal(directory, steps):
+    """Durably record the plan before touching any file"""
+    path = os.path.join(directory, JOURNAL_NAME)
+    with open(path, 'w') as f:
+        f.write(json.dumps({'steps': steps}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def read_journal(directory):
+    """Return (steps, completed_count) from an existing journal, or None"""
+    path = os.path.join(directory, JOURNAL_NAME)
     try:
-        files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+        with open(path) as f:
+            lines = f.read().splitlines()
     except FileNotFoundError:
+        return None
+    steps = [tuple(step) for step in json.loads(lines[0])['steps']]
+    done = 0
+    for line in lines[1:]:
+        try:
+            done = max(done, json.loads(line)['done'])
+        except (ValueError, KeyError):
+            break  # Torn final line from a crash
+    return steps, done
+
+
+def step_applied(directory, src, dst):
+    """True if a step's rename has happened (source gone, target present)"""
+    return not os.path.lexists(os.path.join(directory, src)) and \
+        os.path.lexists(os.path.join(directory, dst))
+
+
+def execute_steps(directory, steps, start=0):
+    """
+    Apply steps in order, appending progress to the journal after each one.
+    
+    The first step is checked before renaming: when resuming it may already
+    have happened (crash between the rename and the journal append), and
+    is then only journaled, not repeated.
+    """
+    with open(os.path.join(directory, JOURNAL_NAME), 'a') as journal:
+        for index in range(start, len(steps)):
+            src, dst = steps[index]
+            if index != start or not step_applied(directory, src, dst):
+                os.rename(os.path.join(directory, src), os.path.join(directory, dst))
+            if not os.path.basename(dst).startswith('.rename-tmp-'):
+                print(f"✓ RENAMED: {src} -> {dst}")
+            journal.write(json.dumps({'done': index + 1}) + '\n')
+            journal.flush()
+
+
+def rollback_steps(directory, steps, done):
+    """Undo the first `done` steps in reverse order"""
+    # Include a step that was renamed but not yet journaled
+    if done < len(steps) and step_applied(directory, *steps[done]):
+        done += 1
+    for index in range(done, 0, -1):
+        src, dst = steps[index - 1]
+        if step_applied(directory, src, dst):
+            os.rename(os.path.join(directory, dst), os.path.join(directory, src))
+            print(f"↺ RESTORED: {dst} -> {src}")
+
+
+def rename_files(directory='.', dry_run=True, resume=False, rollback=False, rename_map=None):
+    """
+    Rename files in the specified directory according to RENAME_MAP.
+    
+    The whole mapping is resolved up front into an ordered plan (swaps and
+    cycles go through temporary names) covering the directory and its
+    thumbnails/ folder. The plan is journaled before anything is renamed,
+    so an interrupted run can be resumed or rolled back.
+    
+    Args:
+        directory: Directory containing files to rename (default: current directory)
+        dry_run: If True, only print what would be renamed without actually renaming
+        resume: Finish the plan recorded in an interrupted run's journal
+        rollback: Undo the completed steps recorded in the journal
+        rename_map: Mapping to apply instead of RENAME_MAP
+    """
+    journal_path = os.path.join(directory, JOURNAL_NAME)
+    if not os.path.isdir(directory):
         print(f"Error: Directory '{directory}' not found")
         return
     
-    # Check each file against the mapping
-    for filename in files:
-        normalized_filename = normalize_filename(filename)
-        
-        if normalized_filename in normalized_map:
-            old_name, new_name = normalized_map[normalized_filename]
-            old_path = os.path.join(directory, filename)
-            new_path = os.path.join(directory, new_name)
-            
-            # Check if target already exists
-            if os.path.exists(new_path):
-                print(f"⚠️  SKIP: {filename} -> {new_name} (target already exists)")
-                continue
-            
-            if dry_run:
-                print(f"✓ WOULD RENAME: {filename} -> {new_name}")
-            else:
-                try:
-                    os.rename(old_path, new_path)
-                    print(f"✓ RENAMED: {filename} -> {new_name}")
-                    renamed_count += 1
-                except Exception as e:
-                    print(f"✗ ERROR: Failed to rename {filename}: {e}")
-        
+    journal = read_journal(directory)
+    if resume or rollback:
+        if journal is None:
+            print(f"No journal found in {directory}; nothing to {'resume' if resume else 'roll back'}")
+            return
+        steps, done = journal
+        if rollback:
+            print(f"Rolling back {done} of {len(steps)} steps...\n")
+            rollback_steps(directory, steps, done)
+        else:
+            print(f"Resuming at step {done + 1} of {len(steps)}...\n")
+            execute_steps(directory, steps, done)
+        os.remove(journal_path)
+        return
+    if journal is not None and not dry_run:
+        print(f"Error: unfinished rename journal at {journal_path}")
+        print("Run with --resume to finish it or --rollback to undo it")
+        return
+    
+    print(f"{'DRY RUN - ' if dry_run else ''}Scanning directory: {directory}\n")
+    
+    rename_map = RENAME_MAP if rename_map is None else rename_map
+    steps, skipped, matched = plan_renames(directory, rename_map)
+    renames = [(src, dst) for src, dst in steps if not os.path.basename(dst).startswith('.rename-tmp-')]
+    
+    for filename, new_name, reason in skipped:
+        print(f"⚠️  SKIP: {filename} -> {new_name} ({reason})")
+    
+    if dry_run:
+        for src, dst in steps:
+            print(f"✓ WOULD RENAME: {src} -> {dst}")
+    elif steps:
+        write_journal(directory, steps)
+        try:
+            execute_steps(directory, steps)
+        except OSError as e:
+            print(f"✗ ERROR: {e}")
+            print("Run with --resume to retry or --rollback to undo the completed renames")
+            return
+        os.remove(journal_path)
+    
     # Report files in mapping that weren't found
-    found_normalized = {normalize_filename(f) for f in files}
-    for normalized_key in normalized_map:
-        if normalized_key not in found_normalized:
-            original_name = normalized_map[normalized_key][0]
-            not_found.append(original_name)
+    not_found = [old for old in rename_map if normalize_filename(old) not in matched]
     
     # Summary
     print(f"\n{'=' * 60}")
     print(f"Summary:")
-    print(f"  Files {'that would be' if dry_run else ''} renamed: {renamed_count if not dry_run else len([f for f in files if normalize_filename(f) in normalized_map])}")
+    print(f"  Files {'that would be ' if dry_run else ''}renamed: {len(renames)}")
+    print(f"  Renames skipped: {len(skipped)}")
     print(f"  Files in mapping but not found: {len(not_found)}")
     
     if not_found:
@@ -143,18 +340,23 @@ if __name__ == "__main__":
     # Parse command line arguments
     if len(sys.argv) > 1:
         if sys.argv[1] in ['-h', '--help']:
-            print("Usage: python3 rename_files.py [directory] [--execute]")
+            print("Usage: python3 rename_files.py [directory] [--execute | --resume | --rollback]")
             print("  directory: Directory containing files to rename (default: current directory)")
+            print("             Files in its thumbnails/ folder are renamed in the same plan")
             print("  --execute: Actually perform the rename (default: dry run)")
+            print("  --resume: Finish an interrupted run from its journal")
+            print("  --rollback: Undo the renames of an interrupted run")
             sys.exit(0)
         
         directory = sys.argv[1] if not sys.argv[1].startswith('--') else '.'
         execute = '--execute' in sys.argv
+        resume = '--resume' in sys.argv
+        rollback = '--rollback' in sys.argv
     else:
         directory = '.'
-        execute = False
+        execute = resume = rollback = False
     
-    dry_run = not execute
+    dry_run = not (execute or resume or rollback)
     
     if dry_run:
         print("=" * 60)
@@ -163,8 +365,8 @@ if __name__ == "__main__":
         print("=" * 60)
         print()
     
-    rename_files(directory, dry_run)
+    rename_files(directory, dry_run, resume=resume, rollback=rollback)
     
     if dry_run:
         print("\nTo execute the renaming, run:")
-        print(f"  python3 rename_files.py {directory if directory != '.' else ''} --execute")
\ No newline at end of file
+        print(f"  python3 rename_files.py {directory if directory != '.' else ''} --execute")